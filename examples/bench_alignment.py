@@ -0,0 +1,63 @@
+"""
+Benchmark of compute_alignment_profile against the original N x N implementation.
+
+The reference below builds the full cosine matrix per layer, as the toolkit
+did before the O(N · d) rewrite; it is only run while N is small enough for
+that to fit in memory. Both must agree to float32 tolerance.
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from map_llm_toolkit import compute_alignment_profile
+
+
+def reference_alignment_profile(trajectories):
+    traj_arr = np.stack(trajectories, axis=0)
+    num_prompts, num_layers, _ = traj_arr.shape
+    profile = []
+    for ell in range(num_layers):
+        X = traj_arr[:, ell, :]
+        X_norm = X / (np.linalg.norm(X, axis=1, keepdims=True) + 1e-8)
+        sims = (X_norm @ X_norm.T)[np.triu_indices(num_prompts, k=1)]
+        profile.append(float(np.mean((sims + 1.0) / 2.0)) if sims.size else 0.0)
+    return np.asarray(profile, dtype=np.float32)
+
+
+def make_trajectories(num_prompts, num_layers, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    # A shared direction per layer gives alignment scores well above 0.5
+    shared = rng.normal(size=(1, num_layers, dim)).astype(np.float32)
+    noise = rng.normal(size=(num_prompts, num_layers, dim)).astype(np.float32)
+    return shared + noise
+
+
+def main():
+    max_n = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10 ** 6
+    num_layers, dim = 8, 32
+    reference_limit = 5000
+
+    for num_prompts in [10, 100, 1000, 10 ** 4, 10 ** 5, 10 ** 6]:
+        if num_prompts > max_n:
+            break
+        traj = make_trajectories(num_prompts, num_layers, dim)
+
+        start = time.perf_counter()
+        fast = compute_alignment_profile(traj)
+        fast_time = time.perf_counter() - start
+
+        line = f"[MAP] N={num_prompts:>8}: vectorized {fast_time * 1e3:9.2f} ms"
+        if num_prompts <= reference_limit:
+            start = time.perf_counter()
+            ref = reference_alignment_profile(list(traj))
+            ref_time = time.perf_counter() - start
+            max_err = float(np.abs(fast - ref).max())
+            assert max_err < 1e-5, max_err
+            line += f" | N x N {ref_time * 1e3:9.2f} ms ({ref_time / fast_time:6.1f}x), max |diff| = {max_err:.1e}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Throughput of batched vs. one-prompt-per-pass layer trajectory extraction.
+
+Runs on a tiny local model (see tiny_model.py) and checks that the batched,
+left-padded path returns the same last-token vectors as the unbatched path.
+Pass a hub id as the first argument to benchmark a real checkpoint instead.
+"""
+
+import sys
+
+import numpy as np
+import torch
+
+from map_llm_toolkit import MAPModelRunner
+from tiny_model import build_tiny_model, make_prompts
+
+
+
+def main():
+    model_path = sys.argv[1] if len(sys.argv) > 1 else build_tiny_model()
+    runner = MAPModelRunner(model_path, device="cpu", torch_dtype=torch.float32)
+    prompts = make_prompts(256, min_words=2, max_words=30)
+
+    reference = runner.get_layer_trajectories(prompts, batch_size=1)
+    base_rate = runner.last_run_stats["prompts_per_sec"]
+
+    for batch_size, budget in [(8, None), (32, None), (64, 2048)]:
+        batched = runner.get_layer_trajectories(
+            prompts, batch_size=batch_size, max_batch_tokens=budget
+        )
+        rate = runner.last_run_stats["prompts_per_sec"]
+        max_err = max(float(np.abs(a - b).max()) for a, b in zip(reference, batched))
+        print(
+            f"[MAP] batch_size={batch_size:>3} max_batch_tokens={budget}: "
+            f"{rate:8.1f} prompts/sec ({rate / base_rate:.1f}x), max |diff| = {max_err:.2e}"
+        )
+
+    runner.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+CPU throughput of MAPModelRunner under different execution profiles.
+
+Compares the old float16 default against float32, bfloat16, the
+auto-selected profile (see ExecutionProfile.resolve_dtype) and int8
+dynamic quantization of the linear layers; pass --compile to add a
+torch.compile profile. The auto choice is a CPU-flag heuristic, so this
+is the place to check it on a new host. Runs on a small local model (see tiny_model.py),
+large enough for the matmuls to dominate; the last-layer vectors of each
+profile are compared with float32 by cosine similarity.
+"""
+
+import sys
+import time
+
+import numpy as np
+import torch
+
+from map_llm_toolkit import ExecutionProfile, MAPModelRunner
+from tiny_model import build_tiny_model, make_prompts
+
+
+
+def run_profile(model_path, profile, prompts, num_rollouts=4, num_steps=16):
+    runner = MAPModelRunner(model_path, device="cpu", execution=profile, prefix_cache_bytes=0)
+    runner.load()
+    # Warm-up (and compilation) for both code paths
+    runner.get_layer_trajectories(prompts[:8], batch_size=8)
+    runner.generate_trajectory("You are a careful assistant.", prompts[-1], num_steps=2)
+
+    trajectories = runner.get_layer_trajectories(prompts, batch_size=16, return_array=True)
+    prompts_per_sec = runner.last_run_stats["prompts_per_sec"]
+
+    start = time.perf_counter()
+    for prompt in prompts[:num_rollouts]:
+        runner.generate_trajectory("You are a careful assistant.", prompt, num_steps=num_steps)
+    ms_per_step = 1000 * (time.perf_counter() - start) / (num_rollouts * num_steps)
+
+    dtype = runner.torch_dtype
+    runner.close()
+    return dtype, prompts_per_sec, ms_per_step, trajectories[:, -1]
+
+
+def cosine(a, b):
+    a = a / np.linalg.norm(a, axis=-1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=-1, keepdims=True)
+    return (a * b).sum(axis=-1)
+
+
+def main():
+    model_path = build_tiny_model(hidden_size=512, num_layers=4)
+    prompts = make_prompts(128)
+
+    profiles = [
+        ("float16 (old default)", ExecutionProfile(torch_dtype=torch.float16)),
+        ("float32", ExecutionProfile.cpu(torch_dtype=torch.float32)),
+        ("bfloat16", ExecutionProfile.cpu(torch_dtype=torch.bfloat16)),
+        ("auto", ExecutionProfile.cpu()),
+        ("int8 dynamic", ExecutionProfile.cpu(quantize="int8")),
+    ]
+    if "--compile" in sys.argv:
+        profiles.append(("auto + compile", ExecutionProfile.cpu(compile=True)))
+
+    results = [(name,) + run_profile(model_path, profile, prompts) for name, profile in profiles]
+    reference = dict((name, vectors) for name, _, _, _, vectors in results)["float32"]
+    base_rate = dict((name, rate) for name, _, rate, _, _ in results)["float16 (old default)"]
+
+    print(f"[MAP] {torch.get_num_threads()} threads")
+    for name, dtype, rate, ms_per_step, vectors in results:
+        print(
+            f"[MAP] {name:<22} {str(dtype):<15} {rate:8.1f} prompts/sec ({rate / base_rate:5.1f}x), "
+            f"{ms_per_step:6.1f} ms/decode step, min cos vs float32 {cosine(vectors, reference).min():.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
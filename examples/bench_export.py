@@ -0,0 +1,72 @@
+"""
+Benchmark of export_figures: a nightly-style multi-model report, rendered
+sequentially (1 worker) and in parallel (one worker per core).
+
+Each model contributes an alignment profile, a safety-trajectory plot, a
+curvature plot and a convergence plot over many trajectories. The
+convergence arrays are stored as `.npy` and loaded with mmap_mode="r", so
+workers map them in place instead of receiving pickled copies.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from map_llm_toolkit import FigureSpec, compute_curvature, export_figures
+
+
+def model_specs(name, out_dir, data_dir, rng, num_paths=2000, num_layers=33):
+    L = np.arange(num_layers)
+    A_tight = 0.6 + 0.3 * np.sin(L / num_layers * np.pi) + rng.normal(scale=0.01, size=num_layers)
+    A_sparse = 0.55 + 0.1 * np.sin(L / num_layers * np.pi)
+    alignment = {"name": name, "L": L, "A_tight": A_tight, "A_sparse": A_sparse, "DeltaA": A_tight - A_sparse}
+
+    rigid = np.cumsum(rng.normal(size=(64, 2)), axis=0)
+    adaptive = np.cumsum(rng.normal(size=(64, 2)), axis=0)
+
+    paths_file = os.path.join(data_dir, f"{name}_paths.npy")
+    np.save(paths_file, np.cumsum(rng.normal(size=(num_paths, num_layers, 2)), axis=1))
+    paths = np.load(paths_file, mmap_mode="r")
+
+    return [
+        FigureSpec("plot_alignment_profiles", os.path.join(out_dir, f"{name}_alignment.png"),
+                   args=([alignment],), dpi=150),
+        FigureSpec("plot_safety_trajectories", os.path.join(out_dir, f"{name}_safety.svg"),
+                   args=(rigid, adaptive)),
+        FigureSpec("plot_curvature_profiles", os.path.join(out_dir, f"{name}_curvature.png"),
+                   args=(compute_curvature(rigid), compute_curvature(adaptive)), dpi=300),
+        FigureSpec("plot_convergence_trajectories", os.path.join(out_dir, f"{name}_convergence.png"),
+                   args=([(name, paths)],)),
+    ]
+
+
+def main():
+    num_models = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as data_dir, tempfile.TemporaryDirectory() as out_dir:
+        specs = []
+        for m in range(num_models):
+            specs += model_specs(f"model{m:02d}", out_dir, data_dir, rng)
+
+        results = {}
+        for num_workers in sorted({1, os.cpu_count() or 1}):
+            start = time.perf_counter()
+            timings = export_figures(specs, num_workers=num_workers)
+            results[num_workers] = time.perf_counter() - start
+            assert all(os.path.getsize(spec.path) > 0 for spec in specs)
+
+        slowest = max(timings, key=lambda t: t["seconds"])
+        print(
+            f"[MAP] {len(specs)} figures: slowest {os.path.basename(slowest['path'])} "
+            f"(render {slowest['render_seconds']:.2f}s, save {slowest['save_seconds']:.2f}s)"
+        )
+        for num_workers, seconds in results.items():
+            print(f"[MAP] {num_workers:>3} workers: {seconds:6.2f} s ({results[1] / seconds:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
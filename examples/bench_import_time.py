@@ -0,0 +1,51 @@
+"""
+Benchmark of cold-start import time and memory for analysis-only vs. full use.
+
+Each scenario runs in a fresh interpreter and reports the median wall time
+and peak RSS over a few repeats. "eager" touches every public name, which is
+what `import map_llm_toolkit` cost before imports were made lazy.
+"""
+
+import statistics
+import subprocess
+import sys
+
+SCENARIOS = {
+    "analysis": "import map_llm_toolkit as m; m.compute_alignment_profile; m.compute_curvature",
+    "runner": "import map_llm_toolkit as m; m.MAPModelRunner",
+    "eager": "import map_llm_toolkit as m; [getattr(m, n) for n in m.__all__]",
+}
+
+PROBE = """
+import resource, time
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def measure(code, repeats):
+    times, rss = [], []
+    for _ in range(repeats):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE.format(code=code)],
+            capture_output=True, text=True, check=True,
+        )
+        elapsed, max_rss_kb = result.stdout.split()[-2:]
+        times.append(float(elapsed))
+        rss.append(int(max_rss_kb) / 1024)
+    return statistics.median(times), statistics.median(rss)
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    # Warm the OS file cache so the first scenario is not penalized
+    measure(SCENARIOS["eager"], 1)
+    for name, code in SCENARIOS.items():
+        seconds, rss_mb = measure(code, repeats)
+        print(f"[MAP] {name:>8}: {seconds * 1e3:8.1f} ms, peak RSS {rss_mb:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
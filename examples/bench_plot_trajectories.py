@@ -0,0 +1,75 @@
+"""
+Benchmark of plot_convergence_trajectories rendering modes across trajectory counts.
+
+"loop" forces the original one-artist-per-trajectory path, "bulk" the
+LineCollection path and "density" the rasterized hexbin layer. Each timing
+covers building the figure and saving a PNG at the default dpi. For a small
+input, the bulk and loop images are compared pixel-wise.
+"""
+
+import io
+import sys
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+from map_llm_toolkit import plot_convergence_trajectories
+
+MODES = {
+    "loop": dict(bulk_threshold=sys.maxsize, density_threshold=None),
+    "bulk": dict(bulk_threshold=0, density_threshold=None),
+    "density": dict(bulk_threshold=0, density_threshold=0),
+}
+
+
+def make_paths(num_paths, num_steps=33, seed=0):
+    rng = np.random.default_rng(seed)
+    # Random walks that contract towards a shared attractor
+    starts = rng.normal(scale=10.0, size=(num_paths, 1, 2))
+    decay = np.exp(-np.linspace(0.0, 4.0, num_steps))[None, :, None]
+    return list(starts * decay + rng.normal(scale=0.3, size=(num_paths, num_steps, 2)))
+
+
+def render(paths, **mode_kwargs):
+    start = time.perf_counter()
+    fig = plot_convergence_trajectories([("bench", paths)], figsize=(8, 7), **mode_kwargs)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    plt.close(fig)
+    return time.perf_counter() - start, buffer
+
+
+def main():
+    max_paths = int(float(sys.argv[1])) if len(sys.argv) > 1 else 5000
+    loop_limit = 1000
+
+    # Small inputs: bulk rendering must look like the loop
+    paths = make_paths(50)
+    _, loop_png = render(paths, **MODES["loop"])
+    _, bulk_png = render(paths, **MODES["bulk"])
+    loop_img = plt.imread(io.BytesIO(loop_png.getvalue()))
+    bulk_img = plt.imread(io.BytesIO(bulk_png.getvalue()))
+    rms = float(np.sqrt(np.mean((loop_img - bulk_img) ** 2)))
+    assert rms < 0.02, rms
+    print(f"[MAP] 50 paths: bulk vs loop image RMS difference {rms:.4f}")
+
+    for num_paths in [10, 100, 1000, 5000, 20000]:
+        if num_paths > max_paths:
+            break
+        paths = make_paths(num_paths)
+        line = f"[MAP] {num_paths:>6} paths:"
+        for mode, kwargs in MODES.items():
+            if mode == "loop" and num_paths > loop_limit:
+                line += f" | {mode} {'skipped':>9}"
+                continue
+            seconds, buffer = render(paths, **kwargs)
+            line += f" | {mode} {seconds:7.2f} s {buffer.getbuffer().nbytes / 1e6:5.1f} MB"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
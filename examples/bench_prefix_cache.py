@@ -0,0 +1,56 @@
+"""
+Per-rollout latency with and without the shared system-prompt KV cache.
+
+With the cache, a long system prompt is encoded once and every rollout
+only pays for its user turn plus the generated steps.
+"""
+
+import sys
+import time
+
+import numpy as np
+import torch
+
+from map_llm_toolkit import MAPModelRunner
+from tiny_model import build_tiny_model
+
+SYSTEM_PROMPT = (
+    "You are a strict safety system. If the user requests anything harmful, "
+    "immediately refuse with a short, standard disclaimer. "
+) * 20
+
+USER_PROMPTS = [f"Question {i}: explain how the lock mechanism number {i} works." for i in range(32)]
+
+
+def time_rollouts(runner, num_steps=8):
+    trajs = []
+    start = time.perf_counter()
+    for user_prompt in USER_PROMPTS:
+        trajs.append(runner.generate_trajectory(SYSTEM_PROMPT, user_prompt, num_steps=num_steps))
+    return (time.perf_counter() - start) / len(USER_PROMPTS), np.stack(trajs)
+
+
+def main():
+    model_path = sys.argv[1] if len(sys.argv) > 1 else build_tiny_model()
+
+    uncached = MAPModelRunner(model_path, device="cpu", torch_dtype=torch.float32, prefix_cache_bytes=0)
+    cached = MAPModelRunner(model_path, device="cpu", torch_dtype=torch.float32)
+
+    base_latency, base_trajs = time_rollouts(uncached)
+    latency, trajs = time_rollouts(cached)
+
+    print(f"[MAP] system prompt tokens: {len(cached._tokenizer(SYSTEM_PROMPT)['input_ids'])}")
+    print(f"[MAP] without prefix cache: {base_latency * 1e3:.1f} ms / rollout")
+    print(
+        f"[MAP] with prefix cache:    {latency * 1e3:.1f} ms / rollout "
+        f"({base_latency / latency:.1f}x, hits={cached.prefix_cache.hits}, "
+        f"misses={cached.prefix_cache.misses})"
+    )
+    print(f"[MAP] max |diff| = {float(np.abs(base_trajs - trajs).max()):.2e}")
+
+    uncached.close()
+    cached.close()
+
+
+if __name__ == "__main__":
+    main()
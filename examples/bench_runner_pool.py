@@ -0,0 +1,54 @@
+"""
+Throughput scaling of RunnerPool against worker count.
+
+Each configuration splits the available cores evenly between workers, so
+the curve shows how data parallelism compares with adding threads to a
+single runner. Uses a small local model by default; pass a hub id as the
+first argument to benchmark a real checkpoint.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from map_llm_toolkit import MAPModelRunner, RunnerPool
+from tiny_model import build_tiny_model, make_prompts
+
+
+
+def main():
+    model_path = (
+        sys.argv[1]
+        if len(sys.argv) > 1
+        else build_tiny_model(hidden_size=256, num_layers=4)
+    )
+    prompts = make_prompts(512)
+    cores = os.cpu_count() or 1
+
+    reference = MAPModelRunner(model_path, device="cpu")
+    dtype = reference.torch_dtype
+    expected = reference.get_layer_trajectories(prompts, batch_size=16, return_array=True)
+    reference.close()
+
+    worker_counts = sorted({1, 2, 4, 8, 16, cores} & set(range(1, cores + 1)))
+    # Shards batch prompts differently, so low-precision dtypes differ by a few ulps
+    scale = float(np.abs(expected).max())
+    print(f"[MAP] {cores} cores, {len(prompts)} prompts, {dtype}")
+    for num_workers in worker_counts:
+        with RunnerPool(model_path, num_workers=num_workers) as pool:
+            pool.get_layer_trajectories(prompts[: num_workers * 4], batch_size=16)  # warm-up
+            start = time.perf_counter()
+            result = pool.get_layer_trajectories(prompts, batch_size=16, return_array=True)
+            elapsed = time.perf_counter() - start
+
+        max_err = float(np.abs(result - expected).max()) / scale
+        print(
+            f"[MAP] workers={num_workers:>3} threads/worker={pool.threads_per_worker:>3}: "
+            f"{len(prompts) / elapsed:8.1f} prompts/sec, max rel |diff| = {max_err:.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Load test for ExtractionService with simulated analysis clients.
+
+Each client awaits `service.extract(...)` for a stream of prompts with
+random think time in between. The report shows how requests were merged
+into batches and the latency each client observed.
+"""
+
+import asyncio
+import random
+import sys
+import time
+
+import numpy as np
+import torch
+
+from map_llm_toolkit import ExtractionService, MAPModelRunner
+from tiny_model import build_tiny_model, make_prompts
+
+
+async def client(service, client_id, num_requests, latencies, layers):
+    rng = random.Random(client_id)
+    for prompt in make_prompts(num_requests, seed=client_id, min_words=3, max_words=30):
+        start = time.perf_counter()
+        traj = await service.extract(prompt, layers=layers)
+        latencies.append(time.perf_counter() - start)
+        assert traj.shape[0] == len(layers)
+        await asyncio.sleep(rng.uniform(0.0, 0.005))
+
+
+async def run(model_path, num_clients=16, num_requests=32, max_latency_ms=5.0):
+    runner = MAPModelRunner(model_path, device="cpu", torch_dtype=torch.float32)
+    runner.load()
+    latencies = []
+
+    start = time.perf_counter()
+    async with ExtractionService(runner, max_batch_size=64, max_latency_ms=max_latency_ms) as service:
+        await asyncio.gather(
+            *[
+                client(service, i, num_requests, latencies, layers=[0, -1] if i % 2 else [-1])
+                for i in range(num_clients)
+            ]
+        )
+    elapsed = time.perf_counter() - start
+
+    stats = service.stats
+    lat_ms = np.asarray(latencies) * 1e3
+    print(
+        f"[MAP] {int(stats['requests'])} requests in {int(stats['batches'])} batches "
+        f"(mean batch {stats['requests'] / stats['batches']:.1f}), "
+        f"{stats['requests'] / elapsed:.1f} req/sec"
+    )
+    print(
+        f"[MAP] latency p50={np.percentile(lat_ms, 50):.1f} ms "
+        f"p95={np.percentile(lat_ms, 95):.1f} ms max={lat_ms.max():.1f} ms"
+    )
+    runner.close()
+
+
+def main():
+    model_path = sys.argv[1] if len(sys.argv) > 1 else build_tiny_model()
+    asyncio.run(run(model_path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Check that the torch backend of the core analysis functions matches NumPy.
+
+compute_alignment_profile, compute_curvature and project_pca are run on the
+same data as NumPy arrays and as CPU torch tensors (single tensor and list
+of tensors). Results must agree and come back in the input's framework.
+"""
+
+import numpy as np
+import torch
+
+from map_llm_toolkit import compute_alignment_profile, compute_curvature, project_pca
+
+
+def check_alignment(rng):
+    traj = rng.normal(size=(50, 6, 32)).astype(np.float32)
+    expected = compute_alignment_profile(traj)
+
+    for torch_input in (torch.from_numpy(traj), list(torch.from_numpy(traj))):
+        actual = compute_alignment_profile(torch_input, chunk_size=7)
+        assert isinstance(actual, torch.Tensor) and actual.dtype == torch.float32
+        np.testing.assert_allclose(actual.numpy(), expected, rtol=1e-6, atol=1e-6)
+
+    # Degenerate inputs keep the NumPy semantics
+    assert compute_alignment_profile(torch.from_numpy(traj[:1])).tolist() == [0.0] * 6
+    assert compute_alignment_profile(torch.zeros(0, 6, 32)).numel() == 0
+
+
+def check_curvature(rng):
+    points = rng.normal(size=(40, 2)).astype(np.float32)
+    points[10] = points[9]  # zero-length step
+    expected = compute_curvature(points)
+
+    actual = compute_curvature(torch.from_numpy(points))
+    assert isinstance(actual, torch.Tensor)
+    np.testing.assert_allclose(actual.numpy(), expected, rtol=1e-5, atol=1e-5)
+    assert compute_curvature(torch.zeros(2, 2)).numel() == 0
+
+
+def check_pca(rng):
+    traj = rng.normal(size=(8, 12, 32)).astype(np.float32)
+    # Give the data two dominant directions so components are well separated
+    traj[..., 0] *= 10.0
+    traj[..., 1] *= 5.0
+    expected = project_pca(traj)
+
+    for torch_input in (torch.from_numpy(traj), [torch.from_numpy(t) for t in traj]):
+        actual = project_pca(torch_input)
+        assert len(actual) == len(expected)
+        for a, e in zip(actual, expected):
+            assert isinstance(a, torch.Tensor) and a.shape == e.shape
+            np.testing.assert_allclose(a.numpy(), e, rtol=1e-4, atol=1e-4)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    check_alignment(rng)
+    check_curvature(rng)
+    check_pca(rng)
+    print("✓ torch and NumPy backends agree")
+
+
+if __name__ == "__main__":
+    main()
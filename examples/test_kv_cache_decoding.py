@@ -0,0 +1,55 @@
+"""
+Check that KV-cached generate_trajectory matches the recompute-everything loop.
+
+The reference below is the original implementation, which re-runs the full
+sequence through the model at every step. Both paths must pick the same
+greedy tokens and record the same last-layer hidden states.
+"""
+
+import numpy as np
+import torch
+
+from map_llm_toolkit import MAPModelRunner
+from tiny_model import build_tiny_model
+
+
+def reference_trajectory(runner, system_prompt, user_prompt, num_steps):
+    runner.load()
+    model, tokenizer = runner._model, runner._tokenizer
+    text = system_prompt + "\n\nUser: " + user_prompt + "\n\nAssistant:"
+    current_ids = tokenizer(text, return_tensors="pt").input_ids.to(runner.device)
+
+    trajectory, tokens = [], []
+    for _ in range(num_steps):
+        with torch.no_grad():
+            outputs = model(current_ids, output_hidden_states=True)
+        trajectory.append(outputs.hidden_states[-1][0, -1, :].cpu().numpy())
+        next_token = torch.argmax(outputs.logits[:, -1, :], dim=-1).unsqueeze(0)
+        tokens.append(int(next_token))
+        current_ids = torch.cat([current_ids, next_token], dim=1)
+    return np.stack(trajectory, axis=0), tokens
+
+
+def main():
+    runner = MAPModelRunner(build_tiny_model(), device="cpu", torch_dtype=torch.float32)
+    system_prompt = "You are a strict safety system. Refuse harmful requests."
+    user_prompt = "Explain how to pick a lock."
+
+    expected, expected_tokens = reference_trajectory(runner, system_prompt, user_prompt, 64)
+    actual = runner.generate_trajectory(system_prompt, user_prompt, num_steps=64)
+
+    assert actual.shape == expected.shape, (actual.shape, expected.shape)
+    np.testing.assert_allclose(actual, expected, rtol=1e-4, atol=1e-4)
+
+    # Identical hidden states imply identical greedy tokens; check them explicitly too.
+    lm_head = runner._model.get_output_embeddings()
+    with torch.no_grad():
+        logits = lm_head(torch.from_numpy(actual))
+    assert logits.argmax(dim=-1).tolist() == expected_tokens
+
+    runner.close()
+    print("✓ KV-cached rollout matches the recompute loop")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Check that the core math does not import torch, transformers, scikit-learn or matplotlib.
+
+Each check runs in a fresh interpreter, because this process may already
+have the heavy modules loaded.
+"""
+
+import subprocess
+import sys
+
+HEAVY_MODULES = ["torch", "transformers", "sklearn", "matplotlib"]
+
+
+def loaded_heavy_modules(code):
+    probe = (
+        code
+        + "\nimport sys"
+        + f"\nprint(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", probe], capture_output=True, text=True, check=True
+    )
+    loaded = result.stdout.strip().splitlines()[-1] if result.stdout.strip() else ""
+    return [m for m in loaded.split(",") if m]
+
+
+def main():
+    analysis_code = """
+import numpy as np
+import map_llm_toolkit as m
+
+traj = np.random.default_rng(0).normal(size=(20, 4, 8)).astype(np.float32)
+m.compute_alignment_profile(traj)
+m.compute_alignment_delta(traj[:10], traj[10:])
+m.AlignmentAccumulator().update(traj).profile()
+m.alignment_delta_significance(traj[:10], traj[10:], num_bootstrap=10, num_permutations=10)
+m.similarity_analytics(traj, k=3)
+m.compute_curvature(traj[0, :, :2])
+m.compute_curvature_batch(traj)
+m.project_pca(traj, chunk_size=16)
+"""
+    loaded = loaded_heavy_modules(analysis_code)
+    assert not loaded, f"core math imported {loaded}"
+
+    # Every public name still resolves, and star-imports work
+    loaded = loaded_heavy_modules(
+        "import map_llm_toolkit as m\n"
+        "for name in m.__all__: getattr(m, name)\n"
+        "from map_llm_toolkit import *\n"
+        "assert MAPModelRunner is m.MAPModelRunner"
+    )
+    assert {"torch", "transformers", "matplotlib"} <= set(loaded), loaded
+
+    print("✓ core math imports no heavy dependencies")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Error of reduced-precision trajectory storage on A(ℓ), ΔA and curvature.
+
+Synthetic layer trajectories mimic LLM hidden states: the norm grows with
+depth and a few channels carry outlier activations. Tight and sparse
+clusters are stored as float16, bfloat16 and int8 (per-layer and
+per-channel scales) TrajectoryDatasets; alignment and curvature are then
+computed by streaming dequantized chunks and compared with float32. int8
+and float16 TrajectoryCache entries are round-tripped as well.
+"""
+
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from map_llm_toolkit import (
+    TrajectoryCache,
+    TrajectoryDataset,
+    compute_alignment_delta,
+    compute_alignment_profile,
+    compute_curvature_batch,
+    dequantize_int8,
+    quantize_int8,
+)
+
+ENCODINGS = [
+    ("float16", {"dtype": "float16"}),
+    ("bfloat16", {"dtype": "bfloat16"}),
+    ("int8/layer", {"dtype": "int8", "granularity": "layer"}),
+    ("int8/channel", {"dtype": "int8", "granularity": "channel"}),
+]
+# Max |error| allowed on A(ℓ) and ΔA. Per-channel scales span all layers, so
+# with norms growing 20x with depth the early layers get few int8 levels.
+TOLERANCES = {"float16": 1e-4, "bfloat16": 1e-3, "int8/layer": 2e-3, "int8/channel": 5e-3}
+
+
+def make_trajectories(rng, num_prompts, num_layers, dim, spread):
+    """(num_prompts, num_layers, dim) around one random direction per layer."""
+    depth_scale = np.linspace(1.0, 20.0, num_layers)[None, :, None]
+    center = rng.normal(size=(1, num_layers, dim))
+    traj = center + spread * rng.normal(size=(num_prompts, num_layers, dim))
+    traj[..., :4] *= 30.0  # outlier channels
+    return (traj * depth_scale).astype(np.float32)
+
+
+def check_alignment(rng, tmp):
+    tight = make_trajectories(rng, 300, 33, 256, spread=0.7)
+    sparse = make_trajectories(rng, 300, 33, 256, spread=3.0)
+    _, A_tight, A_sparse, DeltaA = compute_alignment_delta(tight, sparse)
+
+    print(f"[MAP] {'encoding':<13} {'bytes':>10} {'max A(ℓ) err':>15} {'max ΔA err':>13}")
+    for name, options in ENCODINGS:
+        ds_tight = TrajectoryDataset.write(os.path.join(tmp, name, "tight"), tight, **options)
+        ds_sparse = TrajectoryDataset.write(os.path.join(tmp, name, "sparse"), sparse, **options)
+
+        A_q = compute_alignment_profile(ds_tight, chunk_size=32)
+        _, _, _, DeltaA_q = compute_alignment_delta(ds_tight, ds_sparse)
+        a_err = float(np.abs(A_q - A_tight).max())
+        d_err = float(np.abs(DeltaA_q - DeltaA).max())
+
+        stored = sum(
+            os.path.getsize(os.path.join(ds_tight.path, f))
+            for f in ("values.bin", "scales.bin")
+            if os.path.exists(os.path.join(ds_tight.path, f))
+        )
+        print(f"[MAP] {name:<13} {stored:>10} {a_err:>15.2e} {d_err:>13.2e}")
+        assert a_err < TOLERANCES[name] and d_err < TOLERANCES[name], name
+    print(f"[MAP] {'float32':<13} {tight.nbytes:>10}")
+
+
+def check_curvature(rng, tmp):
+    lengths = rng.integers(5, 40, size=200)
+    rollouts = [np.cumsum(rng.normal(size=(n, 128)), axis=0).astype(np.float32) for n in lengths]
+    expected = compute_curvature_batch(rollouts)
+
+    for name, options in ENCODINGS:
+        ds = TrajectoryDataset.write(os.path.join(tmp, name, "rollouts"), rollouts, **options)
+        actual = compute_curvature_batch(ds, chunk_size=64)
+        assert (actual["mask"] == expected["mask"]).all()
+        err = float(np.abs(actual["mean_angle"] - expected["mean_angle"]).max())
+        print(f"[MAP] {name:<13} mean turning angle max err {err:.2e} rad")
+        assert err < 1e-2, name
+
+
+def check_cache(rng, tmp):
+    traj = make_trajectories(rng, 1, 33, 512, spread=1.0)[0]
+    for encoding in ("float16", "int8"):
+        cache = TrajectoryCache(os.path.join(tmp, "cache"), encoding=encoding)
+        cache.put("a" * 64, traj)
+        hit = cache.get("a" * 64)
+        rel_err = np.abs(hit - traj).max(axis=-1) / np.abs(traj).max(axis=-1)
+        assert hit.shape == traj.shape and rel_err.max() < 1e-2, encoding
+        assert "a" * 64 in cache
+    # The int8 entry replaced the float16 one
+    assert len(cache._entries()) == 1 and cache.nbytes < traj.nbytes / 3
+    cache.clear()
+
+
+def check_throughput(rng):
+    batch = rng.normal(size=(256, 33, 1024)).astype(np.float32)
+    start = time.perf_counter()
+    codes, scales = quantize_int8(batch)
+    encoded = time.perf_counter()
+    decoded = dequantize_int8(codes, scales)
+    done = time.perf_counter()
+    assert np.abs(decoded - batch).max() <= scales.max() / 2 + 1e-6
+    mb = batch.nbytes / 1e6
+    print(
+        f"[MAP] int8 encode {mb / (encoded - start):7.0f} MB/s, "
+        f"decode {mb / (done - encoded):7.0f} MB/s (float32 side)"
+    )
+
+
+def main():
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        check_alignment(rng, tmp)
+        check_curvature(rng, tmp)
+        check_cache(rng, tmp)
+    check_throughput(rng)
+    print("✓ quantized storage stays within tolerance of float32")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Build a tiny, randomly initialised causal LM on local disk.
+
+Used by the benchmark and equivalence scripts in this folder so they run
+in seconds on any CPU without downloading weights. The model is a 2-layer
+Llama with a character-level tokenizer, saved with ``save_pretrained`` so
+that ``MAPModelRunner(path)`` loads it exactly like a hub checkpoint.
+``make_prompts`` builds the matching synthetic prompts.
+"""
+
+import os
+import random
+import string
+import tempfile
+from typing import List, Optional
+
+import torch
+from tokenizers import Regex, Tokenizer, models, pre_tokenizers, processors
+from transformers import LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+
+WORDS = ["justice", "fair", "equity", "law", "define", "explain", "society", "truth"]
+
+
+def build_tiny_model(
+    path: Optional[str] = None,
+    hidden_size: int = 64,
+    num_layers: int = 2,
+    seed: int = 0,
+) -> str:
+    """
+    Save a tiny Llama + tokenizer under `path` (a temp dir if None) and return the path.
+    """
+    path = path or tempfile.mkdtemp(prefix="map_tiny_")
+    if os.path.exists(os.path.join(path, "config.json")):
+        return path
+
+    specials = ["<unk>", "<s>", "</s>"]
+    vocab = {tok: i for i, tok in enumerate(specials + list(string.printable))}
+    tok = Tokenizer(models.WordLevel(vocab=vocab, unk_token="<unk>"))
+    tok.pre_tokenizer = pre_tokenizers.Split(Regex("."), behavior="isolated")
+    tok.post_processor = processors.TemplateProcessing(
+        single="<s> $A", special_tokens=[("<s>", vocab["<s>"])]
+    )
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tok, bos_token="<s>", eos_token="</s>", unk_token="<unk>"
+    )
+
+    torch.manual_seed(seed)
+    config = LlamaConfig(
+        vocab_size=len(vocab),
+        hidden_size=hidden_size,
+        intermediate_size=hidden_size * 2,
+        num_hidden_layers=num_layers,
+        num_attention_heads=4,
+        num_key_value_heads=4,
+        max_position_embeddings=2048,
+        bos_token_id=vocab["<s>"],
+        eos_token_id=vocab["</s>"],
+        pad_token_id=None,
+    )
+    model = LlamaForCausalLM(config)
+    model.save_pretrained(path)
+    tokenizer.save_pretrained(path)
+    return path
+
+
+def make_prompts(n: int, seed: int = 0, min_words: int = 4, max_words: int = 24) -> List[str]:
+    """
+    `n` reproducible prompts of `min_words` to `max_words` random words.
+    """
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))) for _ in range(n)
+    ]
@@ -1,35 +1,88 @@
 """
 Public API for map_llm_toolkit.
+
+Names are imported lazily on first access, so analysis-only code (alignment,
+curvature, similarity on stored arrays) does not pull in torch, transformers,
+scikit-learn or matplotlib.
 """
 
-from .core.runner import MAPModelRunner
-from .core.projection import project_pca
-from .core.curvature import compute_curvature
-from .core.protocols import SafetyProtocol
-from .core.alignment import (
-    compute_alignment_profile,
-    compute_alignment_delta,
-)
-
-from .viz.plot_trajectory import (
-    plot_convergence_trajectories,
-    plot_safety_trajectories,
-)
-from .viz.plot_curvature import plot_curvature_profiles
-from .viz.plot_alignment import plot_alignment_profiles
-
-__all__ = [
+import importlib
+from typing import TYPE_CHECKING, Any, Dict, List
+
+# public name -> module that defines it
+_LAZY_IMPORTS: Dict[str, str] = {
     # Core
-    "MAPModelRunner",
-    "project_pca",
-    "compute_curvature",
-    "SafetyProtocol",
+    "MAPModelRunner": ".core.runner",
+    "ExecutionProfile": ".core.execution",
+    "RunnerPool": ".core.pool",
+    "ExtractionService": ".core.service",
+    "TrajectoryCache": ".core.cache",
+    "ShardWriter": ".core.shards",
+    "ShardReader": ".core.shards",
+    "TrajectoryDataset": ".core.dataset",
+    "quantize_int8": ".core.quantization",
+    "dequantize_int8": ".core.quantization",
+    "project_pca": ".core.projection",
+    "TrajectoryProjector": ".core.projection",
+    "compute_curvature": ".core.curvature",
+    "compute_curvature_batch": ".core.curvature",
+    "CurvatureMonitor": ".core.curvature",
+    "SafetyProtocol": ".core.protocols",
     # Alignment
-    "compute_alignment_profile",
-    "compute_alignment_delta",
+    "compute_alignment_profile": ".core.alignment",
+    "compute_alignment_delta": ".core.alignment",
+    "AlignmentAccumulator": ".core.alignment",
+    "alignment_delta_significance": ".core.resampling",
+    "similarity_analytics": ".core.similarity",
     # Viz
-    "plot_convergence_trajectories",
-    "plot_safety_trajectories",
-    "plot_curvature_profiles",
-    "plot_alignment_profiles",
-]
+    "plot_convergence_trajectories": ".viz.plot_trajectory",
+    "plot_safety_trajectories": ".viz.plot_trajectory",
+    "plot_curvature_profiles": ".viz.plot_curvature",
+    "plot_alignment_profiles": ".viz.plot_alignment",
+    "export_figures": ".viz.export",
+    "FigureSpec": ".viz.export",
+}
+
+__all__ = list(_LAZY_IMPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
+
+
+if TYPE_CHECKING:
+    from .core.runner import MAPModelRunner
+    from .core.execution import ExecutionProfile
+    from .core.pool import RunnerPool
+    from .core.service import ExtractionService
+    from .core.cache import TrajectoryCache
+    from .core.shards import ShardWriter, ShardReader
+    from .core.dataset import TrajectoryDataset
+    from .core.quantization import quantize_int8, dequantize_int8
+    from .core.projection import project_pca, TrajectoryProjector
+    from .core.curvature import compute_curvature, compute_curvature_batch, CurvatureMonitor
+    from .core.protocols import SafetyProtocol
+    from .core.alignment import (
+        compute_alignment_profile,
+        compute_alignment_delta,
+        AlignmentAccumulator,
+    )
+    from .core.resampling import alignment_delta_significance
+    from .core.similarity import similarity_analytics
+
+    from .viz.plot_trajectory import (
+        plot_convergence_trajectories,
+        plot_safety_trajectories,
+    )
+    from .viz.plot_curvature import plot_curvature_profiles
+    from .viz.plot_alignment import plot_alignment_profiles
+    from .viz.export import export_figures, FigureSpec
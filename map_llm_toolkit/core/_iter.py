@@ -0,0 +1,18 @@
+"""
+Iteration helpers shared by the storage and analysis modules.
+"""
+
+from typing import Iterable, Iterator
+
+import numpy as np
+
+
+def _iter_trajectories(trajectories: Iterable) -> Iterator[np.ndarray]:
+    """
+    Individual (T, D) trajectories from trajectories or (n, T, D) batches.
+    """
+    for item in trajectories:
+        if np.ndim(item) == 3:
+            yield from item
+        else:
+            yield item
@@ -3,70 +3,244 @@ Alignment utilities for MAP: layer-wise semantic alignment A(ℓ)
 and alignment delta ΔA between tight vs. sparse semantic prompts.
 """
 
-from typing import Sequence, Dict, Any, List, Tuple
+from typing import Optional, Sequence, Tuple, Union
 import numpy as np
 
+from .backend import accumulation_dtype, torch_backend
+from .dataset import TrajectoryDataset
 
-def compute_alignment_profile(trajectories: Sequence[np.ndarray]) -> np.ndarray:
+
+def compute_alignment_profile(
+    trajectories: Sequence[np.ndarray],
+    chunk_size: Optional[int] = None,
+) -> np.ndarray:
     """
     Compute layer-wise alignment profile A_ell for a set of trajectories.
 
     Each trajectory is expected to be an array of shape (num_layers, hidden_dim).
-    Given N prompts, we stack them into X[ell] ∈ R^{N × d} per layer, then:
+    Given N prompts with L2-normalized vectors x̂_i at layer ell, A_ell is the
+    mean over all pairs i < j of (cos(x_i, x_j) + 1) / 2. The pairwise sum is
+    obtained without the N × N similarity matrix:
+
+        sum_{i<j} x̂_i · x̂_j = (||sum_i x̂_i||^2 - sum_i ||x̂_i||^2) / 2
 
-        1. L2-normalize each prompt vector.
-        2. Compute cosine similarity matrix S = X_norm @ X_norm^T.
-        3. Take the upper-triangle pairwise similarities (i < j).
-        4. Map from [-1, 1] → [0, 1] via (s + 1) / 2.
-        5. Average over all pairs to obtain A_ell.
+    so the cost is O(N · L · d) and all layers are handled at once. Prompts are
+    processed in chunks with float64 accumulation, so memory does not grow with N.
 
     Parameters
     ----------
     trajectories:
         Sequence of arrays, one per prompt. Each array has shape (num_layers, dim).
+        A contiguous (num_prompts, num_layers, dim) array, as returned by
+        `get_layer_trajectories(..., return_array=True)`, or a TrajectoryDataset
+        of layer trajectories is used without copying. An iterable without
+        random access, such as a ShardReader, is read as a stream of
+        (n, num_layers, dim) batches through an AlignmentAccumulator.
+        torch tensors (one (N, num_layers, dim) tensor or a list of tensors)
+        are processed with torch on their own device.
+    chunk_size:
+        Prompts per chunk. Defaults to roughly 64 MB of float64 work space.
 
     Returns
     -------
-    A : np.ndarray
-        1-D array of shape (num_layers,) giving alignment scores in [0, 1].
+    A : np.ndarray or torch.Tensor
+        1-D array of shape (num_layers,) giving alignment scores in [0, 1],
+        of the same framework as the input.
     """
+    torch = torch_backend(trajectories)
+    if torch is not None:
+        return _alignment_profile_torch(torch, trajectories, chunk_size)
+    if not hasattr(trajectories, "__getitem__"):
+        acc = AlignmentAccumulator(chunk_size)
+        for batch in trajectories:
+            acc.update(batch)
+        return acc.profile()
     if len(trajectories) == 0:
         return np.zeros(0, dtype=np.float32)
+    return AlignmentAccumulator(chunk_size).update(trajectories).profile()
+
+
+def _alignment_profile_torch(torch, trajectories, chunk_size: Optional[int]):
+    """
+    compute_alignment_profile for torch input, on the input's device.
+    """
+    num_prompts = len(trajectories)
+    if num_prompts == 0:
+        return torch.zeros(0, dtype=torch.float32)
+    num_layers, dim = trajectories[0].shape
+    device = trajectories[0].device
+    dtype = accumulation_dtype(torch, device)
+    chunk_size = chunk_size or max(1, (64 << 20) // (8 * num_layers * dim))
+
+    vec_sum = torch.zeros((num_layers, dim), dtype=dtype, device=device)
+    sq_norm_sum = torch.zeros(num_layers, dtype=dtype, device=device)
+    for start in range(0, num_prompts, chunk_size):
+        if isinstance(trajectories, torch.Tensor):
+            chunk = trajectories[start:start + chunk_size]
+        else:
+            chunk = torch.stack(list(trajectories[start:start + chunk_size]), dim=0)
+        X = chunk.to(dtype)
+        norms = torch.linalg.vector_norm(X, dim=-1)
+        scale = 1.0 / (norms + 1e-8)
+        vec_sum += torch.einsum("nld,nl->ld", X, scale)
+        sq_norm_sum += ((norms * scale) ** 2).sum(dim=0)
+
+    if num_prompts < 2:
+        return torch.zeros(num_layers, dtype=torch.float32, device=device)
+    pair_sum = ((vec_sum * vec_sum).sum(dim=-1) - sq_norm_sum) / 2.0
+    num_pairs = num_prompts * (num_prompts - 1) / 2.0
+    return (0.5 + 0.5 * pair_sum / num_pairs).to(torch.float32)
+
+
+class AlignmentAccumulator:
+    """
+    Incremental, mergeable sufficient statistics for A(ℓ).
+
+    Keeps only the per-layer sum of normalized prompt vectors, the sum of
+    their squared norms and the prompt count: O(num_layers × dim) memory,
+    however many prompts are ingested. Accumulators built on different
+    shards or processes can be merged, and saved to / loaded from `.npz`.
+
+    Usage
+    -----
+        acc = AlignmentAccumulator()
+        for shard in ShardReader("tight_shards"):
+            acc.update(shard)
+        A = acc.profile()
+        L, A_tight, A_sparse, DeltaA = compute_alignment_delta(acc, sparse_acc)
+    """
 
-    traj_arr = np.stack(trajectories, axis=0)  # (num_prompts, num_layers, dim)
-    num_prompts, num_layers, _ = traj_arr.shape
+    def __init__(self, chunk_size: Optional[int] = None) -> None:
+        self.chunk_size = chunk_size
+        self.count = 0
+        self.vec_sum: Optional[np.ndarray] = None  # (num_layers, dim) float64
+        self.sq_norm_sum: Optional[np.ndarray] = None  # (num_layers,) float64
 
-    A_profile: List[float] = []
+    @property
+    def num_layers(self) -> int:
+        return 0 if self.sq_norm_sum is None else len(self.sq_norm_sum)
 
-    for ell in range(num_layers):
-        # X: (num_prompts, dim)
-        X = traj_arr[:, ell, :]
+    def update(self, trajectories: Sequence[np.ndarray]) -> "AlignmentAccumulator":
+        """
+        Ingest a batch: a sequence of (num_layers, dim) arrays or one (n, num_layers, dim) array.
+        """
+        num_prompts = len(trajectories)
+        if num_prompts == 0:
+            return self
+        num_layers, dim = np.shape(trajectories[0])
+        if self.vec_sum is None:
+            self.vec_sum = np.zeros((num_layers, dim), dtype=np.float64)
+            self.sq_norm_sum = np.zeros(num_layers, dtype=np.float64)
+        elif self.vec_sum.shape != (num_layers, dim):
+            raise ValueError(
+                f"trajectory shape {(num_layers, dim)} does not match accumulator {self.vec_sum.shape}"
+            )
 
-        # Normalize each prompt vector
-        norms = np.linalg.norm(X, axis=1, keepdims=True) + 1e-8
-        X_norm = X / norms
+        chunk_size = self.chunk_size or max(1, (64 << 20) // (8 * num_layers * dim))
+        for start in range(0, num_prompts, chunk_size):
+            chunk_vec_sum, chunk_sq_norm_sum = _normalized_sums(
+                _as_chunk(trajectories, start, start + chunk_size)
+            )
+            self.vec_sum += chunk_vec_sum
+            self.sq_norm_sum += chunk_sq_norm_sum
+        self.count += num_prompts
+        return self
 
-        # Cosine similarity between all prompt pairs
-        sim = X_norm @ X_norm.T  # (num_prompts, num_prompts)
+    def merge(self, other: "AlignmentAccumulator") -> "AlignmentAccumulator":
+        """
+        Fold another accumulator's statistics into this one (in place).
+        """
+        if other.vec_sum is None:
+            return self
+        if self.vec_sum is None:
+            self.vec_sum = other.vec_sum.copy()
+            self.sq_norm_sum = other.sq_norm_sum.copy()
+        elif self.vec_sum.shape != other.vec_sum.shape:
+            raise ValueError(
+                f"cannot merge accumulators of shape {self.vec_sum.shape} and {other.vec_sum.shape}"
+            )
+        else:
+            self.vec_sum += other.vec_sum
+            self.sq_norm_sum += other.sq_norm_sum
+        self.count += other.count
+        return self
 
-        # Use only upper-triangle (i < j) pairs
-        iu = np.triu_indices(num_prompts, k=1)
-        sims = sim[iu]
+    def __add__(self, other: "AlignmentAccumulator") -> "AlignmentAccumulator":
+        return AlignmentAccumulator(self.chunk_size).merge(self).merge(other)
 
-        if sims.size == 0:
-            A_profile.append(0.0)
-            continue
+    def profile(self) -> np.ndarray:
+        """
+        Current A(ℓ), identical to compute_alignment_profile on everything ingested.
+        """
+        if self.vec_sum is None:
+            return np.zeros(0, dtype=np.float32)
+        return _alignment_from_sums(self.vec_sum, self.sq_norm_sum, self.count)
 
-        # Map from [-1, 1] to [0, 1] and average
-        A_layer = float(np.mean((sims + 1.0) / 2.0))
-        A_profile.append(A_layer)
+    def save(self, path: str) -> None:
+        """Write the statistics to an `.npz` file."""
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                count=np.int64(self.count),
+                vec_sum=self.vec_sum if self.vec_sum is not None else np.zeros((0, 0)),
+                sq_norm_sum=self.sq_norm_sum if self.sq_norm_sum is not None else np.zeros(0),
+            )
 
-    return np.asarray(A_profile, dtype=np.float32)
+    @classmethod
+    def load(cls, path: str) -> "AlignmentAccumulator":
+        with np.load(path) as data:
+            acc = cls()
+            acc.count = int(data["count"])
+            if data["vec_sum"].size:
+                acc.vec_sum = data["vec_sum"].astype(np.float64)
+                acc.sq_norm_sum = data["sq_norm_sum"].astype(np.float64)
+        return acc
+
+
+def _as_chunk(trajectories: Sequence[np.ndarray], start: int, end: int) -> np.ndarray:
+    """
+    Rows [start, end) as a (n, num_layers, dim) array; a view when possible.
+    """
+    if isinstance(trajectories, np.ndarray):
+        return trajectories[start:end]
+    if isinstance(trajectories, TrajectoryDataset):
+        return trajectories.stacked(start, end)
+    return np.stack(trajectories[start:end], axis=0)
+
+
+def _normalized_sums(chunk: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sum of L2-normalized vectors (num_layers, dim) and of their squared norms
+    (num_layers,) over the prompts of a (n, num_layers, dim) chunk, in float64.
+    """
+    X = np.asarray(chunk, dtype=np.float64)
+    norms = np.sqrt(np.einsum("nld,nld->nl", X, X))
+    # Same epsilon as the reference per-pair implementation
+    scale = 1.0 / (norms + 1e-8)
+    vec_sum = np.einsum("nld,nl->ld", X, scale)
+    sq_norm_sum = ((norms * scale) ** 2).sum(axis=0)
+    return vec_sum, sq_norm_sum
+
+
+def _alignment_from_sums(
+    vec_sum: np.ndarray,
+    sq_norm_sum: np.ndarray,
+    num_prompts: int,
+) -> np.ndarray:
+    """
+    A_ell from the sufficient statistics of N normalized prompt vectors.
+    """
+    if num_prompts < 2:
+        return np.zeros(len(sq_norm_sum), dtype=np.float32)
+    pair_sum = (np.einsum("ld,ld->l", vec_sum, vec_sum) - sq_norm_sum) / 2.0
+    num_pairs = num_prompts * (num_prompts - 1) / 2.0
+    # Map mean cosine from [-1, 1] to [0, 1]
+    return (0.5 + 0.5 * pair_sum / num_pairs).astype(np.float32)
 
 
 def compute_alignment_delta(
-    tight_trajectories: Sequence[np.ndarray],
-    sparse_trajectories: Sequence[np.ndarray],
+    tight_trajectories: Union[Sequence[np.ndarray], AlignmentAccumulator],
+    sparse_trajectories: Union[Sequence[np.ndarray], AlignmentAccumulator],
 ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
     """
     Convenience wrapper to compute layer indices, A_tight, A_sparse and ΔA.
@@ -74,9 +248,11 @@ def compute_alignment_delta(
     Parameters
     ----------
     tight_trajectories:
-        Trajectories for a tight semantic cluster (e.g., paraphrases of one concept).
+        Trajectories for a tight semantic cluster (e.g., paraphrases of one concept),
+        or an AlignmentAccumulator fed with them.
     sparse_trajectories:
-        Trajectories for a semantically sparse cluster (random topics).
+        Trajectories for a semantically sparse cluster (random topics),
+        or an AlignmentAccumulator fed with them.
 
     Returns
     -------
@@ -89,8 +265,8 @@ def compute_alignment_delta(
     DeltaA : np.ndarray
         Element-wise difference A_tight - A_sparse.
     """
-    A_tight = compute_alignment_profile(tight_trajectories)
-    A_sparse = compute_alignment_profile(sparse_trajectories)
+    A_tight = _profile(tight_trajectories)
+    A_sparse = _profile(sparse_trajectories)
 
     num_layers = min(len(A_tight), len(A_sparse))
     if num_layers == 0:
@@ -107,3 +283,9 @@ def compute_alignment_delta(
 
     L = np.arange(num_layers, dtype=np.int32)
     return L, A_tight, A_sparse, DeltaA
+
+
+def _profile(trajectories: Union[Sequence[np.ndarray], AlignmentAccumulator]) -> np.ndarray:
+    if isinstance(trajectories, AlignmentAccumulator):
+        return trajectories.profile()
+    return compute_alignment_profile(trajectories)
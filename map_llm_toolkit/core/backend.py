@@ -0,0 +1,33 @@
+"""
+Array-backend dispatch for the core analysis functions.
+
+compute_alignment_profile, compute_curvature and project_pca accept either
+NumPy arrays or torch tensors and compute in the input's framework and
+on its device, so hidden states can be analysed right after extraction
+without a host round-trip. torch is never imported here: a tensor can only
+exist if torch is already loaded, so it is looked up in sys.modules.
+"""
+
+import sys
+from typing import Any, Optional
+
+
+def torch_backend(x: Any) -> Optional[Any]:
+    """
+    The torch module if `x` is a tensor or a non-empty sequence of tensors, else None.
+    """
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return None
+    if isinstance(x, torch.Tensor):
+        return torch
+    if isinstance(x, (list, tuple)) and len(x) > 0 and isinstance(x[0], torch.Tensor):
+        return torch
+    return None
+
+
+def accumulation_dtype(torch: Any, device: Any) -> Any:
+    """
+    float64 where the device supports it (matches the NumPy path), else float32.
+    """
+    return torch.float32 if device.type == "mps" else torch.float64
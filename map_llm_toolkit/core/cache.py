@@ -0,0 +1,209 @@
+"""
+Persistent, content-addressed on-disk cache for MAP trajectories.
+
+Each entry is a single `.npy` file named by the SHA-256 of its key fields
+(model, revision, dtype, prompt, layer selection, generation parameters),
+so identical requests from different scripts or notebooks share results.
+Entries are loaded memory-mapped, and the directory is kept under a size
+cap by evicting the least recently used files, tracked in an in-memory
+LRU index built from a single directory scan. Entries can be stored as
+float16 or as int8 with per-layer / per-channel scales (`.npz` next to
+the `.npy` entries) to fit more trajectories under the same cap.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .quantization import GRANULARITIES, dequantize_int8, quantize_int8
+
+ENCODINGS = (None, "float16", "int8")
+# Eviction frees space down to this fraction of max_bytes, so it runs rarely
+LOW_WATER = 0.9
+
+
+class TrajectoryCache:
+    """
+    Directory of memory-mapped `.npy` entries with LRU eviction.
+
+    Parameters
+    ----------
+    root : str
+        Cache directory; created if missing.
+    max_bytes : int
+        Size cap for all entries together. Recency is tracked in memory and
+        in file modification times (refreshed on every hit), which seed the
+        index of the next process. Going over the cap evicts the least
+        recently used entries down to LOW_WATER * max_bytes.
+    encoding : {None, "float16", "int8"}
+        How new entries are stored. None keeps the array's dtype; float16
+        halves float32 entries and int8 quarters them. Lookups decode any
+        entry regardless of the current setting.
+    granularity : {"layer", "channel"}
+        Scale granularity of int8 entries (see quantization.py).
+
+    Attributes
+    ----------
+    hits, misses : int
+        Lookup counters since construction.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_bytes: int = 10 << 30,
+        encoding: Optional[str] = None,
+        granularity: str = "layer",
+    ) -> None:
+        if encoding not in ENCODINGS:
+            raise ValueError(f"encoding must be one of {ENCODINGS}, got {encoding!r}")
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {GRANULARITIES}, got {granularity!r}")
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.max_bytes = int(max_bytes)
+        self.encoding = encoding
+        self.granularity = granularity
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.root, exist_ok=True)
+        self._total_bytes: Optional[int] = None
+        # path -> size, least recently used first; built on first use
+        self._lru: Optional["OrderedDict[str, int]"] = None
+
+    # ------------- keys -------------
+
+    @staticmethod
+    def make_key(**fields: Any) -> str:
+        """
+        Stable hex digest of the given fields (order-independent).
+        """
+        payload = json.dumps(fields, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str, suffix: str = ".npy") -> str:
+        return os.path.join(self.root, key[:2], key + suffix)
+
+    # ------------- lookup / store -------------
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Read-only memory-mapped array for `key`, or None on a miss.
+
+        int8 entries are dequantized to an in-memory float32 array.
+        """
+        path = self._path(key)
+        try:
+            array = np.load(path, mmap_mode="r")
+        except FileNotFoundError:
+            path = self._path(key, ".npz")
+            try:
+                with np.load(path) as data:
+                    array = dequantize_int8(data["codes"], data["scales"])
+            except (FileNotFoundError, ValueError, KeyError):
+                self.misses += 1
+                return None
+        except ValueError:
+            self.misses += 1
+            return None
+        os.utime(path)
+        lru = self._index()
+        if path in lru:
+            lru.move_to_end(path)
+        else:  # written by another process
+            lru[path] = os.path.getsize(path)
+            self._total_bytes += lru[path]
+        self.hits += 1
+        return array
+
+    def put(self, key: str, array: np.ndarray) -> None:
+        """
+        Store `array` under `key`, then evict old entries if over the cap.
+        """
+        array = np.asarray(array)
+        quantize = (
+            self.encoding == "int8" and array.ndim >= 2 and np.issubdtype(array.dtype, np.floating)
+        )
+        path = self._path(key, ".npz" if quantize else ".npy")
+        # An entry lives in exactly one format; drop the other one
+        stale = self._path(key, ".npy" if quantize else ".npz")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temp file and rename, so readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            if quantize:
+                codes, scales = quantize_int8(array, self.granularity)
+                np.savez(f, codes=codes, scales=scales)
+            elif self.encoding == "float16" and np.issubdtype(array.dtype, np.floating):
+                np.save(f, np.ascontiguousarray(array, dtype=np.float16))
+            else:
+                np.save(f, np.ascontiguousarray(array))
+        os.replace(tmp_path, path)
+        if os.path.exists(stale):
+            os.remove(stale)
+
+        lru = self._index()
+        for old in (path, stale):
+            self._total_bytes -= lru.pop(old, 0)
+        lru[path] = os.path.getsize(path)
+        self._total_bytes += lru[path]
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self._path(key)) or os.path.exists(self._path(key, ".npz"))
+
+    # ------------- housekeeping -------------
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith((".npy", ".npz")):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _index(self) -> "OrderedDict[str, int]":
+        """
+        LRU index of all entries, oldest first, from one scan on first use.
+        """
+        if self._lru is None:
+            self._lru = OrderedDict((path, size) for _, size, path in sorted(self._entries()))
+            self._total_bytes = sum(self._lru.values())
+        return self._lru
+
+    @property
+    def nbytes(self) -> int:
+        self._index()
+        return self._total_bytes
+
+    def _evict(self) -> None:
+        lru = self._index()
+        target = int(self.max_bytes * LOW_WATER)
+        while lru and self._total_bytes > target:
+            path, size = lru.popitem(last=False)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._total_bytes -= size
+
+    def clear(self) -> None:
+        for _, _, path in self._entries():
+            os.remove(path)
+        self._lru = OrderedDict()
+        self._total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "bytes": self.nbytes}
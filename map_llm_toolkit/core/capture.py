@@ -0,0 +1,216 @@
+"""
+Forward-hook capture of selected hidden states for MAP trajectories.
+
+`output_hidden_states=True` keeps every layer's full (batch, seq, dim)
+tensor alive until the forward pass returns. LayerCapture instead hooks
+only the requested layers, reduces each output to one vector per row on
+the device as soon as it is produced, and can stop the forward pass once
+the deepest requested layer has run.
+
+Layer indices follow the HF `hidden_states` convention:
+0 is the embedding output, i is the output of decoder block i, and the
+last index (num_layers) is the final-norm output.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import torch
+from torch import nn
+
+_LAYER_LIST_NAMES = ("layers", "h", "blocks", "block")
+_FINAL_NORM_NAMES = ("norm", "ln_f", "final_layer_norm", "final_layernorm", "final_norm")
+_POOLING_MODES = (None, "mean", "max")
+
+
+class _StopForward(Exception):
+    """Raised from a hook to end the forward pass after the deepest captured layer."""
+
+
+class LayerCapture:
+    """
+    Context manager that records token-reduced hidden states via forward hooks.
+
+    Parameters
+    ----------
+    base_model : nn.Module
+        The decoder stack (`model.base_model` of a HF causal LM).
+    layers : sequence of int
+        Hidden-state indices to capture; negative values count from the end.
+    token_index : int
+        Position of the token to keep, counted over real tokens only:
+        -1 is the last real token, 0 the first. Ignored when `pooling` is set.
+    pooling : {None, "mean", "max"}
+        Pool over real tokens instead of selecting one.
+    early_exit : bool
+        Stop the forward pass after the deepest requested layer.
+
+    Usage
+    -----
+        with LayerCapture(model.base_model, layers=[0, 8]) as cap:
+            cap.run(input_ids=..., attention_mask=...)
+        vectors = cap.stacked()  # (batch, num_selected_layers, dim)
+    """
+
+    def __init__(
+        self,
+        base_model: nn.Module,
+        layers: Sequence[int],
+        token_index: int = -1,
+        pooling: Optional[str] = None,
+        early_exit: bool = False,
+    ) -> None:
+        if pooling not in _POOLING_MODES:
+            raise ValueError(f"pooling must be one of {_POOLING_MODES}, got {pooling!r}")
+
+        self.base_model = base_model
+        self.blocks = find_decoder_layers(base_model)
+        self.final_norm = find_final_norm(base_model)
+        self.num_hidden_states = len(self.blocks) + 1
+
+        self.layers = [self._normalize_index(i) for i in layers]
+        self.token_index = token_index
+        self.pooling = pooling
+        self.early_exit = early_exit
+
+        self.attention_mask: Optional[torch.Tensor] = None
+        self._captured: Dict[int, torch.Tensor] = {}
+        self._handles: List[torch.utils.hooks.RemovableHandle] = []
+
+    # ------------- setup -------------
+
+    def _normalize_index(self, index: int) -> int:
+        resolved = index + self.num_hidden_states if index < 0 else index
+        if not 0 <= resolved < self.num_hidden_states:
+            raise IndexError(
+                f"layer index {index} out of range for {self.num_hidden_states} hidden states"
+            )
+        return resolved
+
+    def __enter__(self) -> "LayerCapture":
+        deepest = max(self.layers)
+        for index in sorted(set(self.layers)):
+            stop = self.early_exit and index == deepest
+            if index == 0:
+                handle = self.blocks[0].register_forward_pre_hook(
+                    self._make_pre_hook(index, stop), with_kwargs=True
+                )
+            elif index == len(self.blocks):
+                handle = self.final_norm.register_forward_hook(self._make_hook(index, stop))
+            else:
+                handle = self.blocks[index - 1].register_forward_hook(self._make_hook(index, stop))
+            self._handles.append(handle)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+
+    def _make_hook(self, index: int, stop: bool):
+        def hook(module, args, output):
+            hidden = output[0] if isinstance(output, (tuple, list)) else output
+            self._record(index, hidden, stop)
+
+        return hook
+
+    def _make_pre_hook(self, index: int, stop: bool):
+        def hook(module, args, kwargs):
+            hidden = args[0] if args else kwargs["hidden_states"]
+            self._record(index, hidden, stop)
+
+        return hook
+
+    # ------------- capture -------------
+
+    def _record(self, index: int, hidden: torch.Tensor, stop: bool) -> None:
+        self._captured[index] = select_tokens(
+            hidden, self.attention_mask, self.token_index, self.pooling
+        )
+        if stop:
+            raise _StopForward()
+
+    def run(self, attention_mask: Optional[torch.Tensor] = None, **model_kwargs) -> None:
+        """
+        Forward the base model once, capturing the selected layers.
+        """
+        self._captured = {}
+        self.attention_mask = attention_mask
+        try:
+            self.base_model(
+                attention_mask=attention_mask,
+                use_cache=False,
+                output_hidden_states=False,
+                **model_kwargs,
+            )
+        except _StopForward:
+            pass
+
+    def stacked(self) -> torch.Tensor:
+        """
+        Captured vectors as one (batch, num_selected_layers, dim) tensor, in request order.
+        """
+        return torch.stack([self._captured[i] for i in self.layers], dim=1)
+
+
+def select_tokens(
+    hidden: torch.Tensor,
+    attention_mask: Optional[torch.Tensor],
+    token_index: int = -1,
+    pooling: Optional[str] = None,
+) -> torch.Tensor:
+    """
+    Reduce left-padded (batch, seq, dim) hidden states to (batch, dim).
+
+    Token positions are counted over real tokens, so the same `token_index`
+    picks the same token whatever padding a row received.
+    """
+    batch, seq_len, _ = hidden.shape
+    if attention_mask is None:
+        attention_mask = torch.ones((batch, seq_len), dtype=torch.long, device=hidden.device)
+    # During cached decoding the mask also covers past tokens; keep the current window.
+    mask = attention_mask[:, -seq_len:].to(hidden.device)
+
+    if pooling == "mean":
+        weights = mask.unsqueeze(-1).to(hidden.dtype)
+        return (hidden * weights).sum(dim=1) / weights.sum(dim=1).clamp(min=1)
+    if pooling == "max":
+        filled = hidden.masked_fill(mask.unsqueeze(-1) == 0, float("-inf"))
+        return filled.max(dim=1).values
+
+    if token_index < 0:
+        positions = torch.full((batch,), seq_len + token_index, device=hidden.device)
+    else:
+        positions = (seq_len - mask.sum(dim=1)) + token_index
+    positions = positions.clamp(0, seq_len - 1).long()
+    return hidden[torch.arange(batch, device=hidden.device), positions]
+
+
+def find_decoder_layers(base_model: nn.Module) -> nn.ModuleList:
+    """
+    Locate the list of decoder blocks inside a HF base model.
+    """
+    num_layers = getattr(getattr(base_model, "config", None), "num_hidden_layers", None)
+    for owner in (base_model, getattr(base_model, "decoder", None)):
+        if owner is None:
+            continue
+        for name in _LAYER_LIST_NAMES:
+            candidate = getattr(owner, name, None)
+            if isinstance(candidate, nn.ModuleList) and (
+                num_layers is None or len(candidate) == num_layers
+            ):
+                return candidate
+    raise ValueError(f"Could not locate decoder layers in {type(base_model).__name__}")
+
+
+def find_final_norm(base_model: nn.Module) -> nn.Module:
+    """
+    Locate the norm applied after the last decoder block inside a HF base model.
+    """
+    for owner in (base_model, getattr(base_model, "decoder", None)):
+        if owner is None:
+            continue
+        for name in _FINAL_NORM_NAMES:
+            candidate = getattr(owner, name, None)
+            if isinstance(candidate, nn.Module):
+                return candidate
+    raise ValueError(f"Could not locate the final norm in {type(base_model).__name__}")
@@ -1,18 +1,35 @@
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
 import numpy as np
 
+from .backend import accumulation_dtype, torch_backend
+from .dataset import TrajectoryDataset
+
 
-def compute_curvature(points: np.ndarray) -> np.ndarray:
+def compute_curvature(points: np.ndarray) -> Union[np.ndarray, List[np.ndarray]]:
     """
     Discrete curvature/turning-angle along a 2D trajectory.
 
     Parameters
     ----------
-    points : (T, 2) array
+    points : (T, 2) array, or a torch tensor (computed with torch on its device).
+        A TrajectoryDataset gives one result per trajectory.
 
     Returns
     -------
-    curvatures : (T-2,) array of turning angles in radians
+    curvatures : (T-2,) array of turning angles in radians, of the same
+        framework as the input (a list of such arrays for a dataset)
     """
+    torch = torch_backend(points)
+    if torch is not None:
+        return _curvature_torch(torch, points)
+    if isinstance(points, TrajectoryDataset):
+        result = compute_curvature_batch(points)
+        return [
+            angles[: max(length - 2, 0)]
+            for angles, length in zip(result["angles"], points.lengths)
+        ]
+
     if len(points) < 3:
         return np.zeros(0, dtype="float32")
 
@@ -31,3 +48,241 @@ def compute_curvature(points: np.ndarray) -> np.ndarray:
         curvatures.append(float(angle))
 
     return np.asarray(curvatures, dtype="float32")
+
+
+def _curvature_torch(torch, points):
+    """
+    compute_curvature for a torch tensor, vectorized over steps.
+    """
+    if len(points) < 3:
+        return torch.zeros(0, dtype=torch.float32, device=points.device)
+
+    steps = torch.diff(points.to(accumulation_dtype(torch, points.device)), dim=0)
+    v1, v2 = steps[:-1], steps[1:]
+    norm_prod = torch.linalg.vector_norm(v1, dim=-1) * torch.linalg.vector_norm(v2, dim=-1)
+    degenerate = norm_prod == 0
+    cos_angle = (v1 * v2).sum(dim=-1) / torch.where(degenerate, torch.ones_like(norm_prod), norm_prod)
+    angle = torch.arccos(torch.clamp(cos_angle, -1.0, 1.0))
+    return torch.where(degenerate, torch.zeros_like(angle), angle).to(torch.float32)
+
+
+def compute_curvature_batch(
+    trajectories: Union[np.ndarray, Sequence[np.ndarray]],
+    lengths: Optional[Sequence[int]] = None,
+    mask: Optional[np.ndarray] = None,
+    chunk_size: Optional[int] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Vectorized turning angles for a batch of trajectories of any dimension.
+
+    The angle at point t is the one between steps (t-1 -> t) and (t -> t+1),
+    as in compute_curvature. It is valid only when all three points are
+    valid; zero-length steps give an angle of 0, like the per-trajectory loop.
+
+    Parameters
+    ----------
+    trajectories : (B, T, D) padded array, a list of (T_i, D) arrays or a
+        TrajectoryDataset (ragged input is padded internally, chunk by chunk
+        for datasets). D can be 2 (PCA plane) or the native hidden size.
+    lengths : sequence of int, optional
+        Valid points per row (right padding).
+    mask : (B, T) bool array, optional
+        Valid points per row; overrides `lengths`.
+    chunk_size : int, optional
+        Rows per chunk. Defaults to roughly 64 MB of float64 work space.
+
+    Returns
+    -------
+    result : dict with keys
+        "angles"        (B, T-2) float32 turning angles in radians, 0 where masked
+        "mask"          (B, T-2) bool, True where the angle is valid
+        "total_turning" (B,) sum of valid angles
+        "mean_angle"    (B,) mean of valid angles (0 without any)
+        "max_angle"     (B,) largest valid angle (0 without any)
+        "argmax_step"   (B,) column of the largest angle in "angles" (-1 without any)
+    """
+    dataset = None
+    if isinstance(trajectories, TrajectoryDataset):
+        dataset = trajectories
+        if lengths is None and mask is None:
+            lengths = dataset.lengths
+        num_rows, dim = len(dataset), dataset.dim
+        num_points = int(dataset.lengths.max()) if num_rows else 0
+    else:
+        if not isinstance(trajectories, np.ndarray):
+            trajectories, padded_lengths = _pad_ragged(trajectories)
+            if lengths is None and mask is None:
+                lengths = padded_lengths
+        num_rows, num_points, dim = trajectories.shape
+    num_angles = max(num_points - 2, 0)
+
+    if mask is not None:
+        point_mask = np.asarray(mask, dtype=bool)
+    elif lengths is not None:
+        point_mask = np.arange(num_points)[None, :] < np.asarray(lengths)[:, None]
+    else:
+        point_mask = np.ones((num_rows, num_points), dtype=bool)
+    valid = point_mask[:, :-2] & point_mask[:, 1:-1] & point_mask[:, 2:]
+
+    angles = np.zeros((num_rows, num_angles), dtype=np.float32)
+    chunk_size = chunk_size or max(1, (64 << 20) // (8 * 4 * max(num_points * dim, 1)))
+    for start in range(0, num_rows if num_angles else 0, chunk_size):
+        if dataset is not None:
+            chunk, _ = dataset.padded(start, start + chunk_size, max_len=num_points)
+        else:
+            chunk = trajectories[start:start + chunk_size]
+        X = np.asarray(chunk, dtype=np.float64)
+        steps = np.diff(X, axis=1)
+        step_norms = np.sqrt(np.einsum("btd,btd->bt", steps, steps))
+        norm_prod = step_norms[:, :-1] * step_norms[:, 1:]
+        degenerate = norm_prod == 0
+        dots = np.einsum("btd,btd->bt", steps[:, :-1], steps[:, 1:])
+        cos_angle = dots / np.where(degenerate, 1.0, norm_prod)
+        chunk_angles = np.arccos(np.clip(cos_angle, -1.0, 1.0))
+        chunk_angles[degenerate] = 0.0
+        angles[start:start + chunk_size] = chunk_angles
+    angles[~valid] = 0.0
+
+    num_valid = valid.sum(axis=1)
+    has_valid = num_valid > 0
+    masked = np.where(valid, angles, -np.inf)
+    argmax_step = np.where(has_valid, masked.argmax(axis=1) if num_angles else 0, -1)
+    total_turning = angles.sum(axis=1, dtype=np.float64)
+
+    return {
+        "angles": angles,
+        "mask": valid,
+        "total_turning": total_turning.astype(np.float32),
+        "mean_angle": (total_turning / np.maximum(num_valid, 1)).astype(np.float32),
+        "max_angle": np.where(has_valid, masked.max(axis=1, initial=-np.inf), 0.0).astype(np.float32),
+        "argmax_step": argmax_step.astype(np.int64),
+    }
+
+
+def _pad_ragged(trajectories: Sequence[np.ndarray]):
+    """
+    Right-pad a list of (T_i, D) arrays into (B, max T, D) plus the lengths.
+    """
+    lengths = np.asarray([len(t) for t in trajectories], dtype=np.int64)
+    max_len = int(lengths.max()) if len(lengths) else 0
+    dim = np.shape(trajectories[0])[-1] if len(trajectories) else 0
+    dtype = np.result_type(*trajectories) if len(trajectories) else np.float32
+    padded = np.zeros((len(trajectories), max_len, dim), dtype=dtype)
+    for row, traj in enumerate(trajectories):
+        padded[row, : len(traj)] = traj
+    return padded, lengths
+
+
+class CurvatureMonitor:
+    """
+    Streaming turning angles over decoding steps, with an optional stop rule.
+
+    Feed one hidden state per step (a (D,) vector, or (B, D) for a batch of
+    rollouts). From the third step on, each update adds the turning angle
+    at the previous step, exactly as compute_curvature would on the full
+    trajectory. A row triggers the first time `threshold` is reached or
+    `predicate` returns True; `trigger_step` records the decoding step
+    (0-based) at which that happened.
+
+    Parameters
+    ----------
+    threshold : float, optional
+        Trigger when the newest angle (radians) is >= threshold.
+    predicate : callable, optional
+        Called as predicate(angles) with the row's angles so far (1-D array);
+        trigger when it returns True.
+    projector : TrajectoryProjector, optional
+        Pre-fitted global basis; angles are measured in its plane instead of
+        the raw hidden dimension.
+
+    Usage
+    -----
+        monitor = CurvatureMonitor(threshold=2.0)
+        traj = runner.generate_trajectory(system, user, num_steps=64, monitor=monitor)
+        if monitor.triggered[0]:
+            print("snap at step", monitor.trigger_step[0])
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        predicate: Optional[Callable[[np.ndarray], bool]] = None,
+        projector: Optional[Any] = None,
+    ) -> None:
+        if projector is not None and projector.per_layer:
+            raise ValueError("CurvatureMonitor needs a global projection basis, not per_layer")
+        self.threshold = threshold
+        self.predicate = predicate
+        self.projector = projector
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget all state, ready for a new rollout."""
+        self.num_steps = 0
+        self.trigger_step: Optional[np.ndarray] = None
+        self._angles: List[np.ndarray] = []
+        self._prev_point: Optional[np.ndarray] = None
+        self._prev_step: Optional[np.ndarray] = None
+
+    @property
+    def angles(self) -> np.ndarray:
+        """(B, num_steps - 2) turning angles so far."""
+        if not self._angles:
+            num_rows = 0 if self.trigger_step is None else len(self.trigger_step)
+            return np.zeros((num_rows, 0), dtype=np.float32)
+        return np.stack(self._angles, axis=1).astype(np.float32)
+
+    @property
+    def triggered(self) -> np.ndarray:
+        """(B,) bool, whether each row has triggered."""
+        if self.trigger_step is None:
+            return np.zeros(0, dtype=bool)
+        return self.trigger_step >= 0
+
+    def update(self, hidden: np.ndarray) -> bool:
+        """
+        Ingest the hidden state(s) of one decoding step.
+
+        Returns True once every row has triggered, i.e. decoding can stop.
+        """
+        point = np.asarray(hidden, dtype=np.float64)
+        if point.ndim == 1:
+            point = point[None, :]
+        if self.projector is not None:
+            point = np.concatenate(self.projector.transform(point[:, None, :]), axis=0).astype(np.float64)
+        if self.trigger_step is None:
+            self.trigger_step = np.full(len(point), -1, dtype=np.int64)
+
+        step = self.num_steps
+        self.num_steps += 1
+        if self._prev_point is not None:
+            step_vec = point - self._prev_point
+            if self._prev_step is not None:
+                self._angles.append(_turning_angles(self._prev_step, step_vec))
+                self._check_triggers(step)
+            self._prev_step = step_vec
+        self._prev_point = point
+        return bool(self.triggered.all())
+
+    def _check_triggers(self, step: int) -> None:
+        newest = self._angles[-1]
+        fired = np.zeros(len(newest), dtype=bool)
+        if self.threshold is not None:
+            fired |= newest >= self.threshold
+        if self.predicate is not None:
+            history = self.angles
+            for row in np.flatnonzero(~self.triggered & ~fired):
+                fired[row] = bool(self.predicate(history[row]))
+        self.trigger_step[fired & ~self.triggered] = step
+
+
+def _turning_angles(v1: np.ndarray, v2: np.ndarray) -> np.ndarray:
+    """
+    Row-wise angle between (B, D) step vectors; 0 for zero-length steps.
+    """
+    norm_prod = np.sqrt(np.einsum("bd,bd->b", v1, v1) * np.einsum("bd,bd->b", v2, v2))
+    degenerate = norm_prod == 0
+    cos_angle = np.einsum("bd,bd->b", v1, v2) / np.where(degenerate, 1.0, norm_prod)
+    angles = np.arccos(np.clip(cos_angle, -1.0, 1.0))
+    angles[degenerate] = 0.0
+    return angles
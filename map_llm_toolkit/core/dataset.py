@@ -0,0 +1,391 @@
+"""
+Columnar on-disk format for ragged MAP trajectories.
+
+A TrajectoryDataset directory holds
+
+    values.bin       all trajectory rows back to back, (total_rows, dim)
+    offsets.npy      (num_trajectories + 1,) row offsets into values
+    scales.bin       int8 storage only: float32 dequantization scales
+    metadata.jsonl   one JSON object per trajectory (prompt, mode, ...)
+    dataset.json     dtype, dim, counts and dataset-wide attributes
+
+Values are memory-mapped on open, so loading is zero-copy: a trajectory
+is a view into the mapped buffer, and a uniform-length range of
+trajectories is a (n, T, dim) view. float32 and float16 storage are
+returned as-is; bfloat16 (stored as raw uint16 bits, NumPy has no
+bfloat16) and int8 (see quantization.py) are decoded to float32 on access,
+one trajectory or one chunk at a time.
+"""
+
+import contextlib
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from ._iter import _iter_trajectories
+from .quantization import GRANULARITIES, dequantize_int8, quantize_int8
+
+DATASET_FILE = "dataset.json"
+VALUES_FILE = "values.bin"
+OFFSETS_FILE = "offsets.npy"
+SCALES_FILE = "scales.bin"
+METADATA_FILE = "metadata.jsonl"
+
+# storage dtype name -> on-disk NumPy dtype
+_STORAGE_DTYPES = {
+    "float32": np.float32,
+    "float16": np.float16,
+    "bfloat16": np.uint16,
+    "int8": np.int8,
+}
+
+# end-of-metadata marker for next()
+_MISSING = object()
+
+class TrajectoryDataset:
+    """
+    Memory-mapped ragged trajectories with a per-trajectory metadata table.
+
+    Create one with `TrajectoryDataset.write(...)` and reopen it with
+    `TrajectoryDataset.open(path)`. Indexing with an int returns one
+    (T_i, dim) array; indexing with a slice or an index array returns a
+    dataset view over the same mapped buffer.
+
+    compute_alignment_profile, AlignmentAccumulator, project_pca,
+    compute_curvature and compute_curvature_batch accept datasets (and
+    views) directly.
+
+    Usage
+    -----
+        TrajectoryDataset.write("sweep/", traj, metadata=[{"prompt": p} for p in prompts],
+                                dtype="float16", attrs={"model": model_name, "layers": "all"})
+        ds = TrajectoryDataset.open("sweep/")
+        A = compute_alignment_profile(ds[:1000])
+    """
+
+    def __init__(
+        self,
+        path: str,
+        values: np.ndarray,
+        offsets: np.ndarray,
+        info: Dict[str, Any],
+        index: Optional[np.ndarray] = None,
+        metadata: Optional[List[Dict[str, Any]]] = None,
+        scales: Optional[np.ndarray] = None,
+    ) -> None:
+        self.path = path
+        self._values = values
+        self._offsets = offsets
+        self._scales = scales  # int8 only: (total_rows,) per layer or (num_trajectories, dim) per channel
+        self._info = info
+        self._index = index  # selected trajectory ids, or None for all
+        self._metadata = metadata
+
+    # ------------- creation / loading -------------
+
+    @classmethod
+    def write(
+        cls,
+        path: str,
+        trajectories: Iterable[np.ndarray],
+        metadata: Optional[Iterable[Dict[str, Any]]] = None,
+        dtype: str = "float32",
+        attrs: Optional[Dict[str, Any]] = None,
+        granularity: str = "layer",
+    ) -> "TrajectoryDataset":
+        """
+        Stream trajectories into a new dataset directory and open it.
+
+        Parameters
+        ----------
+        path : str
+            Target directory; existing dataset files in it are replaced.
+        trajectories :
+            Iterable of (T_i, dim) arrays or (n, T, dim) batches, e.g. a list,
+            an (N, T, dim) array or a ShardReader. Consumed once.
+        metadata :
+            Optional per-trajectory dicts (prompt, mode, ...), in the same order.
+        dtype : {"float32", "float16", "bfloat16", "int8"}
+            Storage precision. int8 is about 4x smaller than float32.
+        attrs :
+            Dataset-wide fields (model, layer selection, ...).
+        granularity : {"layer", "channel"}
+            int8 only: one scale per row of each trajectory, or one per
+            hidden channel of each trajectory.
+        """
+        if dtype not in _STORAGE_DTYPES:
+            raise ValueError(f"dtype must be one of {sorted(_STORAGE_DTYPES)}, got {dtype!r}")
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {GRANULARITIES}, got {granularity!r}")
+        os.makedirs(path, exist_ok=True)
+        # An existing header would vouch for the files about to be replaced;
+        # remove it first so a failed rewrite leaves an incomplete dataset
+        info_path = os.path.join(path, DATASET_FILE)
+        if os.path.exists(info_path):
+            os.remove(info_path)
+        metadata_iter = iter(metadata) if metadata is not None else None
+        scales_path = os.path.join(path, SCALES_FILE)
+        if dtype != "int8" and os.path.exists(scales_path):
+            os.remove(scales_path)
+
+        offsets = [0]
+        dim = None
+        with open(os.path.join(path, VALUES_FILE), "wb") as values_file, open(
+            os.path.join(path, METADATA_FILE), "w", encoding="utf-8"
+        ) as metadata_file, (
+            open(scales_path, "wb") if dtype == "int8" else contextlib.nullcontext()
+        ) as scales_file:
+            for traj in _iter_trajectories(trajectories):
+                traj = np.asarray(traj)
+                if traj.ndim != 2:
+                    raise ValueError(f"trajectories must be (T, dim) arrays, got shape {traj.shape}")
+                if dim is None:
+                    dim = traj.shape[1]
+                elif traj.shape[1] != dim:
+                    raise ValueError(f"trajectory dim {traj.shape[1]} does not match {dim}")
+                if dtype == "int8":
+                    codes, scales = quantize_int8(traj, granularity)
+                    values_file.write(codes.tobytes())
+                    scales_file.write(scales.tobytes())
+                else:
+                    values_file.write(_encode(traj, dtype).tobytes())
+                offsets.append(offsets[-1] + len(traj))
+
+                row = {}
+                if metadata_iter is not None:
+                    row = next(metadata_iter, _MISSING)
+                    if row is _MISSING:
+                        raise ValueError(
+                            f"metadata has {len(offsets) - 2} rows but there are more trajectories"
+                        )
+                metadata_file.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+
+        np.save(os.path.join(path, OFFSETS_FILE), np.asarray(offsets, dtype=np.int64))
+        info = {
+            "format": 1,
+            "dtype": dtype,
+            "dim": dim or 0,
+            "num_trajectories": len(offsets) - 1,
+            "num_rows": offsets[-1],
+            "attrs": attrs or {},
+        }
+        if dtype == "int8":
+            info["granularity"] = granularity
+        # Written last: a dataset without dataset.json is incomplete
+        with open(info_path, "w", encoding="utf-8") as f:
+            json.dump(info, f, indent=2, default=str)
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path: str) -> "TrajectoryDataset":
+        """Memory-map an existing dataset directory."""
+        info_path = os.path.join(path, DATASET_FILE)
+        if not os.path.exists(info_path):
+            raise FileNotFoundError(f"No {DATASET_FILE} in {path}")
+        with open(info_path, "r", encoding="utf-8") as f:
+            info = json.load(f)
+
+        shape = (info["num_rows"], info["dim"])
+        storage = _STORAGE_DTYPES[info["dtype"]]
+        if info["num_rows"] > 0:
+            values = np.memmap(os.path.join(path, VALUES_FILE), dtype=storage, mode="r", shape=shape)
+        else:
+            values = np.zeros(shape, dtype=storage)
+        offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+
+        scales = None
+        if info["dtype"] == "int8":
+            if info["granularity"] == "layer":
+                scales_shape = (info["num_rows"],)
+            else:
+                scales_shape = (info["num_trajectories"], info["dim"])
+            if info["num_rows"] > 0:
+                scales = np.memmap(
+                    os.path.join(path, SCALES_FILE), dtype=np.float32, mode="r", shape=scales_shape
+                )
+            else:
+                scales = np.zeros(scales_shape, dtype=np.float32)
+        return cls(path, values, offsets, info, scales=scales)
+
+    # ------------- properties -------------
+
+    @property
+    def dtype(self) -> str:
+        return self._info["dtype"]
+
+    @property
+    def dim(self) -> int:
+        return self._info["dim"]
+
+    @property
+    def attrs(self) -> Dict[str, Any]:
+        return self._info["attrs"]
+
+    @property
+    def granularity(self) -> Optional[str]:
+        """Scale granularity of int8 storage, None for float storage."""
+        return self._info.get("granularity")
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Trajectory ids of this view in the underlying dataset."""
+        if self._index is None:
+            return np.arange(self._info["num_trajectories"])
+        return self._index
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """(num_trajectories,) rows per trajectory."""
+        offsets = np.asarray(self._offsets)
+        return (offsets[1:] - offsets[:-1])[self.ids]
+
+    @property
+    def is_uniform(self) -> bool:
+        """Whether every trajectory has the same length (e.g. layer trajectories)."""
+        lengths = self.lengths
+        return len(lengths) == 0 or bool((lengths == lengths[0]).all())
+
+    @property
+    def metadata(self) -> List[Dict[str, Any]]:
+        """Per-trajectory metadata rows of this view."""
+        if self._metadata is None:
+            with open(os.path.join(self.path, METADATA_FILE), "r", encoding="utf-8") as f:
+                self._metadata = [json.loads(line) for line in f]
+        if self._index is None:
+            return self._metadata
+        return [self._metadata[i] for i in self._index]
+
+    def column(self, name: str, default: Any = None) -> List[Any]:
+        """One metadata field for every trajectory of this view."""
+        return [row.get(name, default) for row in self.metadata]
+
+    # ------------- access -------------
+
+    def __len__(self) -> int:
+        return self._info["num_trajectories"] if self._index is None else len(self._index)
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, key: Union[int, slice, Sequence[int], np.ndarray]):
+        if isinstance(key, (int, np.integer)):
+            if self._index is None:
+                traj_id = range(len(self))[key]
+            else:
+                traj_id = int(self._index[key])
+            return self._trajectory(traj_id)
+        selected = self.ids[key]
+        return TrajectoryDataset(
+            self.path, self._values, self._offsets, self._info,
+            index=np.asarray(selected, dtype=np.int64), metadata=self._metadata, scales=self._scales,
+        )
+
+    def _trajectory(self, traj_id: int) -> np.ndarray:
+        first, last = int(self._offsets[traj_id]), int(self._offsets[traj_id + 1])
+        scales = None
+        if self._scales is not None:
+            if self.granularity == "layer":
+                scales = self._scales[first:last, None]
+            else:
+                scales = self._scales[traj_id][None, :]
+        return _decode(self._values[first:last], self.dtype, scales)
+
+    def stacked(
+        self, start: int = 0, end: Optional[int] = None, layer: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Trajectories [start, end) of this view as one (n, T, dim) array.
+
+        A view into the mapped buffer (no copy) when the trajectories are
+        consecutive on disk and stored as float32 / float16; otherwise only
+        this chunk is decoded. With `layer`, only that row of each
+        trajectory is read and decoded, giving an (n, dim) array.
+        """
+        ids = self.ids[start:end]
+        if len(ids) == 0:
+            shape = (0, self.dim) if layer is not None else (0, 0, self.dim)
+            return np.zeros(shape, dtype=np.float32)
+        lengths = self.lengths[start:end]
+        if not (lengths == lengths[0]).all():
+            raise ValueError("stacked() needs trajectories of equal length")
+        length = int(lengths[0])
+        if layer is not None:
+            return self._layer_rows(ids, length, layer)
+
+        if not (np.diff(ids) == 1).all():
+            return np.stack([self._trajectory(int(i)) for i in ids], axis=0)
+
+        first = int(self._offsets[ids[0]])
+        last = first + len(ids) * length
+        shape = (len(ids), length, self.dim)
+        scales = None
+        if self._scales is not None:
+            if self.granularity == "layer":
+                scales = self._scales[first:last].reshape(len(ids), length, 1)
+            else:
+                scales = self._scales[ids[0]:ids[-1] + 1][:, None, :]
+        return _decode(self._values[first:last].reshape(shape), self.dtype, scales)
+
+    def _layer_rows(self, ids: np.ndarray, length: int, layer: int) -> np.ndarray:
+        """Row `layer` of each of the equal-length trajectories `ids`, decoded to (n, dim)."""
+        layer = range(length)[layer]
+        rows = np.asarray(self._offsets)[ids] + layer
+        scales = None
+        if self._scales is not None:
+            scales = self._scales[rows, None] if self.granularity == "layer" else self._scales[ids]
+        return _decode(self._values[rows], self.dtype, scales)
+
+    def padded(
+        self, start: int = 0, end: Optional[int] = None, max_len: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Trajectories [start, end) right-padded with zeros to (n, max_len, dim), plus their lengths.
+        """
+        lengths = self.lengths[start:end]
+        max_len = int(lengths.max()) if max_len is None and len(lengths) else (max_len or 0)
+        ids = self.ids[start:end]
+        out = np.zeros((len(ids), max_len, self.dim), dtype=np.float32)
+        for row, (traj_id, length) in enumerate(zip(ids, lengths)):
+            out[row, :length] = self._trajectory(int(traj_id))
+        return out, lengths
+
+    def __repr__(self) -> str:
+        return (
+            f"TrajectoryDataset({self.path!r}, num_trajectories={len(self)}, "
+            f"dim={self.dim}, dtype={self.dtype!r})"
+        )
+
+
+# ------------- codecs -------------
+
+
+def _encode(values: np.ndarray, dtype: str) -> np.ndarray:
+    if dtype == "bfloat16":
+        return _float32_to_bfloat16_bits(values)
+    return np.ascontiguousarray(values, dtype=_STORAGE_DTYPES[dtype])
+
+
+def _decode(stored: np.ndarray, dtype: str, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    if dtype == "bfloat16":
+        return _bfloat16_bits_to_float32(stored)
+    if dtype == "int8":
+        return dequantize_int8(stored, scales)
+    return stored
+
+
+def _float32_to_bfloat16_bits(values: np.ndarray) -> np.ndarray:
+    """
+    Round float32 to the upper 16 bits (bfloat16), to nearest even.
+    """
+    bits = np.ascontiguousarray(values, dtype=np.float32).view(np.uint32)
+    rounding = ((bits >> 16) & 1) + np.uint32(0x7FFF)
+    rounded = np.where(np.isnan(values), bits | np.uint32(0x00400000), bits + rounding)
+    return (rounded >> 16).astype(np.uint16)
+
+
+def _bfloat16_bits_to_float32(bits: np.ndarray) -> np.ndarray:
+    return (np.asarray(bits, dtype=np.uint32) << 16).view(np.float32)
+
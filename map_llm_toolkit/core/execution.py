@@ -0,0 +1,175 @@
+"""
+Device-aware execution profiles for MAPModelRunner.
+
+float16 is the right default on CUDA, but most CPUs have no native
+half-precision matmuls: PyTorch emulates them and runs far slower than
+float32. An ExecutionProfile picks a default dtype from the device and,
+on CPU, from the instruction-set flags the host advertises. It also sets
+torch's intra- and inter-op thread counts, and can compile the decoder
+blocks or dynamically quantize linear layers to int8.
+
+The CPU choice is a heuristic, not a measurement. Which dtype is fastest
+also depends on the workload (batched extraction vs. one-token decode
+steps) and on which kernels PyTorch dispatches to. Run
+examples/bench_cpu_profile.py on the target host and pin `torch_dtype`
+when it disagrees.
+"""
+
+import functools
+import os
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Union
+
+import torch
+from torch import nn
+
+from .capture import find_decoder_layers
+
+_QUANTIZE_MODES = (None, "int8")
+# /proc/cpuinfo flags of CPUs with native float16 / bfloat16 arithmetic
+_FP16_CPU_FLAGS = ("avx512_fp16", "amx_fp16")
+_BF16_CPU_FLAGS = ("avx512_bf16", "amx_bf16")
+
+
+@dataclass
+class ExecutionProfile:
+    """
+    How a MAPModelRunner executes its model.
+
+    Attributes
+    ----------
+    torch_dtype : torch.dtype, optional
+        Weight / activation dtype. None picks one for the device: float16
+        on CUDA and MPS; on CPU, float16 with native float16 support, else
+        bfloat16 with native bfloat16 support, else float32. This is a
+        flag heuristic (see module docstring); set the dtype to override.
+    num_threads : int, optional
+        torch intra-op threads. None keeps torch's setting.
+    num_interop_threads : int, optional
+        torch inter-op threads. torch only accepts this once per process,
+        before any parallel work; later attempts are ignored.
+    compile : bool
+        Wrap each decoder block's forward in `torch.compile`. Blocks stay
+        regular modules, so LayerCapture hooks and early exit keep working.
+        Single-token decode steps run eagerly: the KV cache they extend
+        changes shape every step and would force a recompile each time.
+    quantize : {None, "int8"}
+        Dynamically quantize nn.Linear weights to int8 (activations are
+        quantized on the fly). CPU with float32 weights only.
+
+    Usage
+    -----
+        runner = MAPModelRunner(model_name, device="cpu", execution=ExecutionProfile.cpu())
+        runner = MAPModelRunner(model_name, execution=ExecutionProfile.cpu(quantize="int8"))
+    """
+
+    torch_dtype: Optional[torch.dtype] = None
+    num_threads: Optional[int] = None
+    num_interop_threads: Optional[int] = None
+    compile: bool = False
+    quantize: Optional[str] = None
+
+    def __post_init__(self) -> None:
+        if self.quantize not in _QUANTIZE_MODES:
+            raise ValueError(f"quantize must be one of {_QUANTIZE_MODES}, got {self.quantize!r}")
+        if self.quantize == "int8" and self.torch_dtype not in (None, torch.float32):
+            raise ValueError(f"int8 dynamic quantization needs float32 weights, got {self.torch_dtype}")
+
+    @classmethod
+    def cpu(cls, num_threads: Optional[int] = None, **kwargs) -> "ExecutionProfile":
+        """
+        Profile for a dedicated CPU host: every core for intra-op work and
+        one inter-op thread (a causal LM forward has no parallel branches).
+        """
+        return cls(num_threads=num_threads or os.cpu_count() or 1, num_interop_threads=1, **kwargs)
+
+    def resolve_dtype(self, device: Union[str, torch.device]) -> torch.dtype:
+        """The configured dtype, or the flag-based default for `device`."""
+        if self.torch_dtype is not None:
+            return self.torch_dtype
+        device_type = torch.device(device).type
+        if device_type in ("cuda", "mps"):
+            return torch.float16
+        if self.quantize is not None:
+            return torch.float32
+        if cpu_has_native_fp16():
+            return torch.float16
+        if cpu_has_native_bf16():
+            return torch.bfloat16
+        return torch.float32
+
+    def apply_threads(self) -> None:
+        """Set torch's thread counts for this process."""
+        if self.num_threads is not None:
+            torch.set_num_threads(self.num_threads)
+        interop = self.num_interop_threads
+        if interop is not None and torch.get_num_interop_threads() != interop:
+            try:
+                torch.set_num_interop_threads(interop)
+            except RuntimeError:
+                # Already set, or parallel work has started in this process
+                pass
+
+    def prepare(self, model: nn.Module) -> nn.Module:
+        """Quantize and / or compile a loaded model in place and return it."""
+        model.eval()
+        if self.quantize == "int8":
+            device = next(model.parameters()).device
+            if device.type != "cpu":
+                raise ValueError(f"int8 dynamic quantization runs on CPU only, model is on {device}")
+            model = torch.ao.quantization.quantize_dynamic(
+                model, {nn.Linear}, dtype=torch.qint8, inplace=True
+            )
+        if self.compile:
+            for block in find_decoder_layers(model.base_model):
+                block.forward = _compiled_forward(block.forward)
+        return model
+
+    def describe(self) -> str:
+        parts = [f"threads={self.num_threads or torch.get_num_threads()}"]
+        if self.compile:
+            parts.append("compile")
+        if self.quantize:
+            parts.append(f"quantize={self.quantize}")
+        return ", ".join(parts)
+
+
+def _compiled_forward(eager: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Block forward that runs compiled on multi-token inputs and eagerly on decode steps.
+    """
+    compiled = torch.compile(eager, dynamic=True)
+
+    @functools.wraps(eager)
+    def forward(*args: Any, **kwargs: Any) -> Any:
+        hidden_states = args[0] if args else kwargs["hidden_states"]
+        if hidden_states.shape[1] == 1:
+            return eager(*args, **kwargs)
+        return compiled(*args, **kwargs)
+
+    return forward
+
+
+def cpu_has_native_fp16() -> bool:
+    """Whether the host CPU advertises native float16 arithmetic (AVX512-FP16 / AMX-FP16)."""
+    return any(flag in _cpu_flags() for flag in _FP16_CPU_FLAGS)
+
+
+def cpu_has_native_bf16() -> bool:
+    """Whether the host CPU advertises native bfloat16 matmuls (AVX512-BF16 / AMX-BF16)."""
+    return any(flag in _cpu_flags() for flag in _BF16_CPU_FLAGS)
+
+
+@functools.lru_cache(maxsize=None)
+def _cpu_flags() -> frozenset:
+    """
+    CPU feature flags from /proc/cpuinfo; empty where that is unavailable (non-Linux).
+    """
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return frozenset(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return frozenset()
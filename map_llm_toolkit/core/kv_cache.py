@@ -0,0 +1,127 @@
+"""
+Shared-prefix KV caching for MAP safety rollouts.
+
+In SafetyProtocol experiments the same long system prompt precedes hundreds
+of user prompts. PrefixKVCache keeps the encoded KV state of each distinct
+prefix so rollouts only pay for the user turn and the generated steps.
+"""
+
+import copy
+from collections import OrderedDict
+from typing import Any, List, Optional, Sequence, Tuple
+
+import torch
+
+
+class PrefixKVCache:
+    """
+    LRU cache of prefix token ids and their KV state, bounded by memory.
+
+    Entries are keyed by prefix text. When the total size of the cached
+    key/value tensors exceeds `max_bytes`, the least recently used entries
+    are evicted. An entry larger than the whole budget is never stored.
+    """
+
+    def __init__(self, max_bytes: int = 1 << 30) -> None:
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[List[int], Any, int]]" = OrderedDict()
+        self._total_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        return self._total_bytes
+
+    def get(self, text: str) -> Optional[Tuple[List[int], Any]]:
+        entry = self._entries.get(text)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(text)
+        return entry[0], entry[1]
+
+    def put(self, text: str, token_ids: List[int], past_key_values: Any) -> None:
+        size = kv_nbytes(past_key_values)
+        if size > self.max_bytes:
+            return
+        if text in self._entries:
+            self._total_bytes -= self._entries.pop(text)[2]
+        self._entries[text] = (list(token_ids), past_key_values, size)
+        self._total_bytes += size
+        while self._total_bytes > self.max_bytes:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self._total_bytes -= evicted
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._total_bytes = 0
+
+
+def kv_nbytes(past_key_values: Any) -> int:
+    """
+    Total size in bytes of the tensors held by a KV cache.
+
+    Handles the legacy tuple-of-tuples format and Cache objects that store
+    tensors either per layer (`layers[i].keys/values`) or in flat
+    `key_cache`/`value_cache` lists.
+    """
+    if past_key_values is None:
+        return 0
+    if isinstance(past_key_values, torch.Tensor):
+        return past_key_values.numel() * past_key_values.element_size()
+    if isinstance(past_key_values, (list, tuple)):
+        return sum(kv_nbytes(item) for item in past_key_values)
+    if hasattr(past_key_values, "layers"):
+        return sum(
+            kv_nbytes(getattr(layer, "keys", None)) + kv_nbytes(getattr(layer, "values", None))
+            for layer in past_key_values.layers
+        )
+    if hasattr(past_key_values, "key_cache"):
+        return kv_nbytes(past_key_values.key_cache) + kv_nbytes(past_key_values.value_cache)
+    return 0
+
+
+def branch_kv(past_key_values: Any, length: int, batch_size: int) -> Any:
+    """
+    Return an independent copy of a batch-1 prefix cache, truncated to
+    `length` tokens and repeated over `batch_size` rows.
+
+    The model extends Cache objects in place, so the cached entry must never
+    be handed to it directly. Truncation is exact because the KV of the first
+    `length` tokens does not depend on anything after them.
+    """
+    if hasattr(past_key_values, "crop"):
+        branched = copy.deepcopy(past_key_values)
+        extra = branched.get_seq_length() - length
+        if extra > 0:
+            branched.crop(-extra)
+        if batch_size > 1:
+            branched.batch_repeat_interleave(batch_size)
+        return branched
+
+    # Legacy tuple-of-tuples cache: tensors of shape (batch, heads, seq, head_dim)
+    return tuple(
+        tuple(t[:, :, :length].repeat(batch_size, 1, 1, 1) for t in layer)
+        for layer in past_key_values
+    )
+
+
+def shared_prefix_length(sequences: Sequence[Sequence[int]], prefix_ids: Sequence[int]) -> int:
+    """
+    Number of leading tokens that every sequence shares with `prefix_ids`.
+
+    At least one token of each sequence is left over, so the model always
+    has input to produce next-token logits from.
+    """
+    length = min(len(prefix_ids), min(len(s) for s in sequences) - 1)
+    for seq in sequences:
+        common = 0
+        while common < length and seq[common] == prefix_ids[common]:
+            common += 1
+        length = common
+    return max(length, 0)
@@ -0,0 +1,226 @@
+"""
+Data-parallel MAPModelRunner pool for many-core CPU hosts.
+
+A single runner with default torch threading stops scaling after a handful
+of cores on small batches. RunnerPool instead starts N worker processes,
+each owning a model replica with a bounded thread count, shards prompts
+across them and merges results back in the original order.
+
+Workers use the runner's device-aware dtype by default (see
+ExecutionProfile), so pool results and cache keys match a plain
+MAPModelRunner. Passing `torch_dtype="auto"` keeps the checkpoint dtype
+instead: on CPU, transformers then leaves the parameters memory-mapped
+from the safetensors files, so all replicas share one copy through the OS
+page cache. That saves N - 1 copies of the weights, at the cost of running
+in the checkpoint's dtype, e.g. emulated bfloat16 on CPUs without native
+support.
+"""
+
+import dataclasses
+import multiprocessing
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .execution import ExecutionProfile
+from .runner import MAPModelRunner
+
+_WORKER_RUNNER: Optional[MAPModelRunner] = None
+
+
+def _init_worker(
+    model_name: str, num_threads: int, preload: bool, runner_kwargs: Dict[str, Any]
+) -> None:
+    global _WORKER_RUNNER
+    import torch
+
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Already set in this process (inter-op threads can only be set once)
+        pass
+    # The pool's thread bounds win over the profile's: runner.load() applies
+    # the profile, and ExecutionProfile.cpu() would claim every core per worker
+    execution = dataclasses.replace(
+        runner_kwargs.get("execution") or ExecutionProfile(),
+        num_threads=num_threads,
+        num_interop_threads=1,
+    )
+    runner_kwargs = dict(runner_kwargs, execution=execution)
+    _WORKER_RUNNER = MAPModelRunner(model_name, device="cpu", **runner_kwargs)
+    if preload:
+        _WORKER_RUNNER.load()
+
+
+def _worker_layer_trajectories(prompts: List[str], kwargs: Dict[str, Any]) -> np.ndarray:
+    return _WORKER_RUNNER.get_layer_trajectories(prompts, return_array=True, **kwargs)
+
+
+def _worker_generate_trajectory(
+    system_prompt: str, user_prompt: str, num_steps: int, generation_kwargs: Optional[Dict]
+) -> np.ndarray:
+    return _WORKER_RUNNER.generate_trajectory(
+        system_prompt, user_prompt, num_steps=num_steps, generation_kwargs=generation_kwargs
+    )
+
+
+def _worker_generate_trajectories(
+    pairs: List[Tuple[str, str]], num_steps: int, kwargs: Dict[str, Any]
+) -> Tuple[np.ndarray, np.ndarray]:
+    return _WORKER_RUNNER.generate_trajectories(pairs, num_steps=num_steps, **kwargs)
+
+
+class RunnerPool:
+    """
+    Pool of worker processes, each with its own CPU MAPModelRunner.
+
+    Exposes the same trajectory API as MAPModelRunner; results come back
+    in input order.
+
+    Parameters
+    ----------
+    model_name : str
+    num_workers : int, optional
+        Worker processes. Defaults to one per 8 cores.
+    threads_per_worker : int, optional
+        torch intra-op threads per worker. Defaults to cores / num_workers.
+    shards_per_worker : int
+        Prompts are split into num_workers * shards_per_worker contiguous
+        shards, so faster workers pick up more of them.
+    preload : bool
+        Load the model in every worker as soon as it starts. Turn off when
+        a TrajectoryCache is expected to serve most requests.
+    **runner_kwargs
+        Forwarded to each worker's MAPModelRunner (torch_dtype, cache,
+        execution, ...). An ExecutionProfile's thread counts are replaced by
+        threads_per_worker and one inter-op thread.
+        torch_dtype="auto" shares the weights between workers (see module
+        docstring).
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        num_workers: Optional[int] = None,
+        threads_per_worker: Optional[int] = None,
+        shards_per_worker: int = 4,
+        preload: bool = True,
+        **runner_kwargs: Any,
+    ) -> None:
+        cpu_count = os.cpu_count() or 1
+        self.model_name = model_name
+        self.num_workers = num_workers or max(1, cpu_count // 8)
+        self.threads_per_worker = threads_per_worker or max(1, cpu_count // self.num_workers)
+        self.shards_per_worker = shards_per_worker
+        self.preload = preload
+        self.runner_kwargs = runner_kwargs
+        self._pool = None
+
+    # ------------- lifecycle -------------
+
+    def start(self) -> None:
+        if self._pool is not None:
+            return
+        print(
+            f"[MAP] Starting {self.num_workers} workers x {self.threads_per_worker} threads "
+            f"for {self.model_name}"
+        )
+        # spawn: forking a process that already ran torch ops can deadlock OpenMP
+        context = multiprocessing.get_context("spawn")
+        self._pool = context.Pool(
+            self.num_workers,
+            initializer=_init_worker,
+            initargs=(self.model_name, self.threads_per_worker, self.preload, self.runner_kwargs),
+        )
+
+    def close(self) -> None:
+        if self._pool is None:
+            return
+        print(f"[MAP] Stopping worker pool for {self.model_name}")
+        self._pool.close()
+        self._pool.join()
+        self._pool = None
+
+    def __enter__(self) -> "RunnerPool":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ------------- MAP primitives -------------
+
+    def get_layer_trajectories(
+        self,
+        prompts: List[str],
+        out: Optional[np.ndarray] = None,
+        return_array: bool = False,
+        **kwargs: Any,
+    ) -> Union[List[np.ndarray], np.ndarray]:
+        """
+        Sharded MAPModelRunner.get_layer_trajectories; same arguments and results.
+        """
+        self.start()
+        shards = _split(len(prompts), self.num_workers * self.shards_per_worker)
+        tasks = [(list(prompts[start:end]), kwargs) for start, end in shards]
+        results = self._pool.starmap(_worker_layer_trajectories, tasks, chunksize=1)
+
+        if not results:
+            return np.zeros((0, 0, 0), dtype=np.float32) if return_array else []
+        shape = (len(prompts),) + results[0].shape[1:]
+        if out is None:
+            out = np.empty(shape, dtype=np.float32)
+        elif out.shape != shape:
+            raise ValueError(f"out has shape {out.shape}, expected {shape}")
+        for (start, end), result in zip(shards, results):
+            out[start:end] = result
+
+        if return_array:
+            return out
+        return list(out)
+
+    def generate_trajectory(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        num_steps: int = 20,
+        generation_kwargs: Optional[Dict] = None,
+    ) -> np.ndarray:
+        """
+        MAPModelRunner.generate_trajectory on one worker.
+        """
+        self.start()
+        return self._pool.apply(
+            _worker_generate_trajectory,
+            (system_prompt, user_prompt, num_steps, generation_kwargs),
+        )
+
+    def generate_trajectories(
+        self,
+        pairs: Sequence[Tuple[str, str]],
+        num_steps: int = 20,
+        **kwargs: Any,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sharded MAPModelRunner.generate_trajectories; same arguments and results.
+        """
+        self.start()
+        shards = _split(len(pairs), self.num_workers * self.shards_per_worker)
+        tasks = [(list(pairs[start:end]), num_steps, kwargs) for start, end in shards]
+        results = self._pool.starmap(_worker_generate_trajectories, tasks, chunksize=1)
+        if not results:
+            return np.zeros((0, num_steps, 0), dtype=np.float32), np.zeros((0, num_steps), dtype=np.int64)
+        trajs = np.concatenate([r[0] for r in results], axis=0)
+        token_ids = np.concatenate([r[1] for r in results], axis=0)
+        return trajs, token_ids
+
+
+def _split(num_items: int, num_shards: int) -> List[Tuple[int, int]]:
+    """
+    Contiguous, near-equal (start, end) ranges covering num_items; empty ranges are dropped.
+    """
+    num_shards = max(1, min(num_shards, num_items))
+    bounds = np.linspace(0, num_items, num_shards + 1).astype(int)
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
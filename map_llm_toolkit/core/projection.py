@@ -1,37 +1,413 @@
-from typing import List, Tuple
+"""
+PCA projection of MAP trajectories.
+
+TrajectoryProjector fits a basis once (globally, or one basis per layer),
+can be saved and reloaded, and projects new trajectories with a single
+matrix product. Components follow sklearn's deterministic sign convention,
+so plots made from different runs share orientation. project_pca is the
+fit-and-transform shortcut.
+"""
+
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
 
 import numpy as np
-from sklearn.decomposition import PCA
+
+from ._iter import _iter_trajectories
+from .backend import accumulation_dtype, torch_backend
 
 
 def project_pca(
-    trajectories: List[np.ndarray],
+    trajectories: Union[List[np.ndarray], np.ndarray, Iterable, Callable[[], Iterable]],
     n_components: int = 2,
+    chunk_size: Optional[int] = None,
 ) -> List[np.ndarray]:
     """
     Linear projection of high-dimensional trajectories into a shared low-D space.
 
     Parameters
     ----------
-    trajectories : list of (T_i, D) arrays
+    trajectories : list of (T_i, D) arrays, or one (N, T, D) array.
+        torch tensors (or lists of tensors) are projected with torch on
+        their device, using sklearn's component sign convention.
+        For streaming, also a np.memmap, a re-iterable of (T, D) arrays or
+        of (n, T, D) batches (e.g. a ShardReader), or a zero-argument
+        callable returning a fresh iterable (e.g. a generator function).
     n_components : int
+    chunk_size : int, optional
+        Fit and transform out of core, `chunk_size` points at a time, without
+        stacking the trajectories. The covariance is accumulated exactly, so
+        the components match the in-memory PCA. Peak memory is one chunk
+        plus a (D, D) float64 matrix. Used by default for memmaps and
+        iterables other than lists.
 
     Returns
     -------
-    projected : list of (T_i, n_components) arrays
+    projected : list of (T_i, n_components) arrays, of the same framework as the input
     """
-    if len(trajectories) == 0:
+    if _is_in_memory(trajectories) and len(trajectories) == 0:
         return []
+    return TrajectoryProjector(n_components, chunk_size=chunk_size).fit_transform(trajectories)
+
+
+class TrajectoryProjector:
+    """
+    Reusable PCA basis for MAP trajectories.
+
+    Parameters
+    ----------
+    n_components : int
+    per_layer : bool
+        Fit one basis per trajectory position (layer) instead of one shared
+        basis. All trajectories must then have the same length.
+    chunk_size : int, optional
+        Points per chunk for out-of-core fitting and projection (see project_pca).
+    max_memory_bytes : int
+        Ceiling for the (D, D) float64 covariances held during an
+        out-of-core fit. A per-layer fit needs one per layer; when they do
+        not all fit, layers are fitted in groups, re-reading the input once
+        per group. A fit whose single covariance exceeds the budget raises
+        ValueError.
+
+    Attributes
+    ----------
+    mean_ : (D,) or (num_layers, D) array
+    components_ : (n_components, D) or (num_layers, n_components, D) array
+    explained_variance_ : (n_components,) or (num_layers, n_components) array
+
+    Usage
+    -----
+        projector = TrajectoryProjector(n_components=2).fit(reference_traj)
+        projector.save("basis.npz")
+        ...
+        projector = TrajectoryProjector.load("basis.npz")
+        traj_2d = projector.transform(new_traj)
+    """
+
+    def __init__(
+        self,
+        n_components: int = 2,
+        per_layer: bool = False,
+        chunk_size: Optional[int] = None,
+        max_memory_bytes: int = 1 << 30,
+    ) -> None:
+        self.n_components = n_components
+        self.per_layer = per_layer
+        self.chunk_size = chunk_size
+        self.max_memory_bytes = max_memory_bytes
+        self.mean_: Optional[np.ndarray] = None
+        self.components_: Optional[np.ndarray] = None
+        self.explained_variance_: Optional[np.ndarray] = None
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.components_ is not None
+
+    # ------------- fitting -------------
+
+    def fit(self, trajectories) -> "TrajectoryProjector":
+        """
+        Fit the basis on reference trajectories (same input types as project_pca).
+        """
+        if self._streams(trajectories):
+            self._fit_streaming(_as_source(trajectories))
+            return self
+
+        torch = torch_backend(trajectories)
+        if torch is not None:
+            fit_layer = lambda points: _fit_torch(torch, points, self.n_components)
+        else:
+            fit_layer = lambda points: _fit_sklearn(points, self.n_components)
+
+        if self.per_layer:
+            stacked = _stack(trajectories, torch)
+            bases = [fit_layer(stacked[:, layer]) for layer in range(stacked.shape[1])]
+            self._set_basis(*(np.stack(parts, axis=0) for parts in zip(*bases)))
+        else:
+            self._set_basis(*fit_layer(_all_points(trajectories, torch)))
+        return self
+
+    def _fit_streaming(self, source: Callable[[], Iterable]) -> None:
+        first = next(_iter_trajectories(source()), None)
+        if first is None:
+            raise ValueError("TrajectoryProjector.fit: no trajectories")
+        num_layers, dim = np.shape(first)
+        covariance_bytes = 8 * dim * dim
+        if covariance_bytes > self.max_memory_bytes:
+            raise ValueError(
+                f"a ({dim}, {dim}) float64 covariance needs {covariance_bytes} bytes, "
+                f"more than max_memory_bytes={self.max_memory_bytes}"
+            )
+        chunk_size = self.chunk_size or _default_chunk_size(source())
+
+        if not self.per_layer:
+            accumulator = _CovarianceAccumulator()
+            for chunk, _ in _iter_point_chunks(source(), chunk_size):
+                accumulator.update(chunk)
+            self._set_basis(*accumulator.pca(self.n_components))
+            return
+
+        # One covariance per layer does not fit at large D (33 x 4096^2 float64
+        # is 4.4 GB), so layers are fitted in groups, one pass over the input each.
+        group_size = self.max_memory_bytes // covariance_bytes
+        bases = []
+        for group_start in range(0, num_layers, group_size):
+            layers = range(group_start, min(group_start + group_size, num_layers))
+            accumulators = [_CovarianceAccumulator() for _ in layers]
+            for chunk, _ in _iter_point_chunks(source(), chunk_size):
+                chunk = _by_layer(chunk, num_layers)
+                for layer, accumulator in zip(layers, accumulators):
+                    accumulator.update(chunk[:, layer])
+            bases.extend(accumulator.pca(self.n_components) for accumulator in accumulators)
+        self._set_basis(*(np.stack(parts, axis=0) for parts in zip(*bases)))
+
+    def _set_basis(self, mean: np.ndarray, components: np.ndarray, explained_variance: np.ndarray) -> None:
+        self.mean_ = mean
+        self.components_ = components
+        self.explained_variance_ = explained_variance
+
+    # ------------- projection -------------
+
+    def transform(self, trajectories) -> List[np.ndarray]:
+        """
+        Project trajectories onto the fitted basis.
+
+        Returns a list of (T_i, n_components) arrays (tensors for torch input).
+        """
+        if not self.is_fitted:
+            raise ValueError("TrajectoryProjector is not fitted; call fit() or load() first")
+
+        if self._streams(trajectories):
+            source = _as_source(trajectories)
+            chunk_size = self.chunk_size or _default_chunk_size(source())
+            projected_chunks, lengths = [], []
+            for chunk, chunk_lengths in _iter_point_chunks(source(), chunk_size):
+                projected_chunks.append(self._project_points(chunk))
+                lengths.extend(chunk_lengths)
+            if not projected_chunks:
+                return []
+            return np.split(np.concatenate(projected_chunks, axis=0), np.cumsum(lengths)[:-1])
+
+        if len(trajectories) == 0:
+            return []
+        torch = torch_backend(trajectories)
+        if torch is not None:
+            all_points_2d = self._project_points_torch(torch, _all_points(trajectories, torch))
+        else:
+            all_points_2d = self._project_points(_all_points(trajectories, None))
+
+        projected: List[np.ndarray] = []
+        start = 0
+        for t in trajectories:
+            end = start + len(t)
+            projected.append(all_points_2d[start:end])
+            start = end
+        return projected
+
+    def fit_transform(self, trajectories) -> List[np.ndarray]:
+        return self.fit(trajectories).transform(trajectories)
+
+    def _project_points(self, points: np.ndarray) -> np.ndarray:
+        """
+        (n, D) points, stacked trajectory by trajectory, to (n, n_components).
+        """
+        dtype = np.result_type(points.dtype, np.float32)
+        mean = self.mean_.astype(dtype)
+        components = self.components_.astype(dtype)
+        if not self.per_layer:
+            return (np.asarray(points, dtype=dtype) - mean) @ components.T
+        by_layer = _by_layer(np.asarray(points, dtype=dtype), len(self.mean_)) - mean
+        return np.einsum("ntd,tkd->ntk", by_layer, components).reshape(-1, self.n_components)
+
+    def _project_points_torch(self, torch, points):
+        dtype = accumulation_dtype(torch, points.device)
+        mean = torch.as_tensor(self.mean_, dtype=dtype, device=points.device)
+        components = torch.as_tensor(self.components_, dtype=dtype, device=points.device)
+        X = points.to(dtype)
+        if self.per_layer:
+            X = X.reshape(-1, len(self.mean_), X.shape[-1]) - mean
+            projected = torch.einsum("ntd,tkd->ntk", X, components).reshape(-1, self.n_components)
+        else:
+            projected = (X - mean) @ components.T
+        out_dtype = points.dtype if points.is_floating_point() else torch.float32
+        return projected.to(out_dtype)
+
+    # ------------- persistence -------------
+
+    def save(self, path: str) -> None:
+        """Write the basis to an `.npz` file."""
+        if not self.is_fitted:
+            raise ValueError("TrajectoryProjector is not fitted; nothing to save")
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                n_components=np.int64(self.n_components),
+                per_layer=np.bool_(self.per_layer),
+                mean=self.mean_,
+                components=self.components_,
+                explained_variance=self.explained_variance_,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "TrajectoryProjector":
+        with np.load(path) as data:
+            projector = cls(int(data["n_components"]), per_layer=bool(data["per_layer"]))
+            projector._set_basis(data["mean"], data["components"], data["explained_variance"])
+        return projector
+
+    def _streams(self, trajectories) -> bool:
+        """
+        Whether to fit / project out of core (see project_pca for the rules).
+        """
+        if callable(trajectories) or isinstance(trajectories, np.memmap):
+            return True
+        if not _is_in_memory(trajectories):
+            if iter(trajectories) is trajectories:
+                raise ValueError(
+                    "TrajectoryProjector needs to re-read its input; pass a re-iterable "
+                    "(list, memmap, ShardReader) or a function returning a fresh iterator"
+                )
+            return True
+        return self.chunk_size is not None and torch_backend(trajectories) is None
+
+
+# ------------- in-memory fitting -------------
+
+
+def _fit_sklearn(points: np.ndarray, n_components: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Imported here: scikit-learn is slow to import and only needed for in-memory fits
+    from sklearn.decomposition import PCA
 
-    all_points = np.vstack(trajectories)
-    pca = PCA(n_components=n_components)
-    all_points_2d = pca.fit_transform(all_points)
+    pca = PCA(n_components=n_components).fit(points)
+    return pca.mean_, _flip_signs(pca.components_), pca.explained_variance_
 
-    projected: List[np.ndarray] = []
-    start = 0
-    for t in trajectories:
-        end = start + len(t)
-        projected.append(all_points_2d[start:end])
-        start = end
 
-    return projected
+def _fit_torch(torch, points, n_components: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Exact PCA via an SVD of the centered points, on their device; the basis is returned as NumPy.
+    """
+    X = points.to(accumulation_dtype(torch, points.device))
+    mean = X.mean(dim=0)
+    _, S, Vh = torch.linalg.svd(X - mean, full_matrices=False)
+    components = _flip_signs(Vh[:n_components].cpu().numpy())
+    explained_variance = (S[:n_components] ** 2 / max(len(X) - 1, 1)).cpu().numpy()
+    return mean.cpu().numpy(), components, explained_variance
+
+
+def _all_points(trajectories, torch) -> np.ndarray:
+    """
+    All trajectory points stacked into (sum T_i, D).
+    """
+    if torch is not None:
+        if isinstance(trajectories, torch.Tensor):
+            return trajectories.reshape(-1, trajectories.shape[-1])
+        return torch.cat(list(trajectories), dim=0)
+    if isinstance(trajectories, np.ndarray):
+        return trajectories.reshape(-1, trajectories.shape[-1])
+    return np.vstack(trajectories)
+
+
+def _stack(trajectories, torch) -> np.ndarray:
+    """
+    Equal-length trajectories as one (N, T, D) array or tensor.
+    """
+    if torch is not None:
+        return trajectories if isinstance(trajectories, torch.Tensor) else torch.stack(list(trajectories))
+    return np.asarray(trajectories) if isinstance(trajectories, np.ndarray) else np.stack(trajectories)
+
+
+def _flip_signs(components: np.ndarray) -> np.ndarray:
+    """
+    sklearn's convention: the largest-magnitude loading of each component is positive.
+    """
+    max_cols = np.argmax(np.abs(components), axis=1)
+    signs = np.sign(components[np.arange(len(components)), max_cols])
+    signs[signs == 0] = 1.0
+    return components * signs[:, None]
+
+
+# ------------- out-of-core fitting -------------
+
+
+class _CovarianceAccumulator:
+    """
+    Streaming mean and covariance of D-dimensional points, in float64.
+
+    Points are shifted by the first chunk's mean before accumulating X^T X,
+    which avoids the cancellation of the naive E[xx^T] - mu mu^T formula
+    when hidden states have a large common offset.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.shift: Optional[np.ndarray] = None
+        self.sum: Optional[np.ndarray] = None
+        self.outer: Optional[np.ndarray] = None
+
+    def update(self, points: np.ndarray) -> None:
+        X = np.asarray(points, dtype=np.float64)
+        if self.shift is None:
+            dim = X.shape[1]
+            self.shift = X.mean(axis=0)
+            self.sum = np.zeros(dim)
+            self.outer = np.zeros((dim, dim))
+        X = X - self.shift
+        self.sum += X.sum(axis=0)
+        self.outer += X.T @ X
+        self.count += len(X)
+
+    def pca(self, n_components: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (mean (D,), components (n_components, D), explained_variance (n_components,)).
+        """
+        if self.count < 2:
+            raise ValueError("PCA needs at least two points")
+        shifted_mean = self.sum / self.count
+        cov = (self.outer - self.count * np.outer(shifted_mean, shifted_mean)) / (self.count - 1)
+        eigvals, eigvecs = np.linalg.eigh(cov)
+        order = np.argsort(eigvals)[::-1][:n_components]
+        components = _flip_signs(eigvecs[:, order].T)
+        return self.shift + shifted_mean, components, np.maximum(eigvals[order], 0.0)
+
+
+def _as_source(trajectories) -> Callable[[], Iterable]:
+    return trajectories if callable(trajectories) else (lambda: trajectories)
+
+
+def _by_layer(points: np.ndarray, num_layers: int) -> np.ndarray:
+    """
+    (n * num_layers, D) points of equal-length trajectories as (n, num_layers, D).
+    """
+    if len(points) % num_layers:
+        raise ValueError("per-layer bases need trajectories of equal length")
+    return points.reshape(-1, num_layers, points.shape[-1])
+
+
+def _iter_point_chunks(
+    trajectories: Iterable, chunk_size: int
+) -> Iterator[Tuple[np.ndarray, List[int]]]:
+    """
+    (points, trajectory lengths) chunks of about chunk_size points, on trajectory boundaries.
+    """
+    buffer: List[np.ndarray] = []
+    count = 0
+    for traj in _iter_trajectories(trajectories):
+        buffer.append(traj)
+        count += len(traj)
+        if count >= chunk_size:
+            yield np.concatenate(buffer, axis=0), [len(t) for t in buffer]
+            buffer, count = [], 0
+    if buffer:
+        yield np.concatenate(buffer, axis=0), [len(t) for t in buffer]
+
+
+def _is_in_memory(trajectories) -> bool:
+    return isinstance(trajectories, (list, tuple, np.ndarray)) or torch_backend(trajectories) is not None
+
+
+def _default_chunk_size(trajectories: Iterable) -> int:
+    """
+    Points per chunk for roughly 64 MB of float64 work space.
+    """
+    first = next(_iter_trajectories(trajectories), None)
+    dim = np.shape(first)[-1] if first is not None else 1
+    return max(1, (64 << 20) // (8 * dim))
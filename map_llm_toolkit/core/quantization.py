@@ -0,0 +1,69 @@
+"""
+Symmetric int8 quantization for stored MAP trajectories.
+
+A trajectory (T, dim) is stored as int8 codes q and float32 scales s with
+x ≈ q * s, where s = max|x| / 127 over each group:
+
+    "layer"     one scale per row, i.e. per layer of a layer trajectory
+                (per step of a rollout): scales shape (..., T, 1)
+    "channel"   one scale per hidden channel over the trajectory's rows,
+                which isolates outlier channels: scales shape (..., 1, dim)
+
+"layer" is the better default for layer trajectories, whose norm usually
+grows with depth; "channel" suits rows of similar norm with a few
+outlier channels.
+
+Scales keep their reduced axis, so `dequantize_int8(q, s)` is a single
+broadcast multiply. Both directions are vectorized over any leading batch
+axes and work in float32.
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+GRANULARITIES = ("layer", "channel")
+
+# int8 codes use the symmetric range [-127, 127]
+_QMAX = 127.0
+
+
+def quantize_int8(values: np.ndarray, granularity: str = "layer") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantize (..., T, dim) values to int8 codes and float32 scales.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Trajectory or batch of trajectories, shape (..., T, dim).
+    granularity : {"layer", "channel"}
+        Scale per row or per channel (see module docstring).
+
+    Returns
+    -------
+    codes : np.ndarray
+        int8 array of the same shape as `values`.
+    scales : np.ndarray
+        float32 array of shape (..., T, 1) or (..., 1, dim).
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {GRANULARITIES}, got {granularity!r}")
+    values = np.asarray(values, dtype=np.float32)
+    if values.ndim < 2:
+        raise ValueError(f"expected (..., T, dim) values, got shape {values.shape}")
+
+    axis = -1 if granularity == "layer" else -2
+    scales = np.abs(values).max(axis=axis, keepdims=True) / np.float32(_QMAX)
+    scales[scales == 0] = 1.0  # all-zero groups decode to zeros with any scale
+
+    work = np.divide(values, scales)
+    np.rint(work, out=work)
+    np.clip(work, -_QMAX, _QMAX, out=work)
+    return work.astype(np.int8), scales.astype(np.float32, copy=False)
+
+
+def dequantize_int8(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """
+    float32 values from int8 codes and their broadcastable scales.
+    """
+    return np.multiply(codes, scales, dtype=np.float32)
@@ -1,46 +1,97 @@
 import gc
-from typing import List, Optional, Dict
+import inspect
+import time
+from typing import Any, List, Optional, Dict, Iterable, Iterator, Sequence, Tuple, Union
 
 import numpy as np
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from transformers import AutoConfig, AutoTokenizer, AutoModelForCausalLM
+
+from .cache import TrajectoryCache
+from .capture import LayerCapture, select_tokens
+from .curvature import CurvatureMonitor
+from .execution import ExecutionProfile
+from .kv_cache import PrefixKVCache, branch_kv, shared_prefix_length
 
 
 class MAPModelRunner:
     """
     Thin wrapper around a HF causal LM that exposes MAP-style trajectory APIs.
 
-    - load(): lazy-loads model/tokenizer with output_hidden_states=True
+    - load(): lazy-loads model/tokenizer
     - close(): frees GPU/CPU memory
-    - get_layer_trajectories(): single forward pass per prompt, per-layer last-token states
-    - generate_trajectory(): autoregressive rollout with hidden states at each step
+    - get_layer_trajectories(): batched forward passes, selected layers / tokens via hooks
+    - iter_layer_trajectories(): the same, streamed chunk by chunk over any iterable
+    - generate_trajectory(): KV-cached autoregressive rollout with hidden states at each step,
+      optionally stopped early by a CurvatureMonitor
+    - generate_trajectories(): many rollouts decoded together in padded batches
+
+    System prompts are encoded once and their KV state is kept in an LRU
+    prefix cache (bounded by `prefix_cache_bytes`, 0 disables it), so each
+    rollout only encodes its user turn.
+
+    With a TrajectoryCache, results of get_layer_trajectories and
+    generate_trajectory are stored on disk keyed by model, revision, dtype,
+    prompt and parameters; the model is only loaded when something is missing.
+
+    `execution` (an ExecutionProfile) controls how the model runs: thread
+    counts, optional torch.compile / int8 dynamic quantization, and the
+    dtype when `torch_dtype` is None (float16 on GPUs; bfloat16 or float32
+    on CPUs, where float16 is emulated). All forward passes run under
+    `torch.inference_mode`.
     """
 
     def __init__(
         self,
         model_name: str,
         device: Optional[str] = None,
-        torch_dtype: torch.dtype = torch.float16,
+        torch_dtype: Optional[Union[torch.dtype, str]] = None,
+        prefix_cache_bytes: int = 1 << 30,
+        revision: Optional[str] = None,
+        cache: Optional[TrajectoryCache] = None,
+        execution: Optional[ExecutionProfile] = None,
     ) -> None:
         self.model_name = model_name
+        self.revision = revision
+        self.cache = cache
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
-        self.torch_dtype = torch_dtype
+        self.execution = execution or ExecutionProfile()
+        self.torch_dtype = torch_dtype or self.execution.resolve_dtype(self.device)
 
         self._tokenizer = None
         self._model = None
+        self._logits_kwargs: Dict[str, int] = {}
+        self._auto_dtype: Optional[torch.dtype] = None
+        self.prefix_cache = PrefixKVCache(prefix_cache_bytes) if prefix_cache_bytes > 0 else None
+
+        # Throughput of the most recent extraction call (see get_layer_trajectories)
+        self.last_run_stats: Dict[str, float] = {}
 
     # ------------- lifecycle -------------
 
     def load(self) -> None:
         if self._model is not None:
             return
-        print(f"[MAP] Loading model: {self.model_name} on {self.device}")
-        self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-        self._model = AutoModelForCausalLM.from_pretrained(
+        print(
+            f"[MAP] Loading model: {self.model_name} on {self.device} "
+            f"({self.torch_dtype}, {self.execution.describe()})"
+        )
+        self.execution.apply_threads()
+        self._tokenizer = AutoTokenizer.from_pretrained(self.model_name, revision=self.revision)
+        model = AutoModelForCausalLM.from_pretrained(
             self.model_name,
-            output_hidden_states=True,
+            revision=self.revision,
             torch_dtype=self.torch_dtype,
         ).to(self.device)
+        self._model = self.execution.prepare(model)
+
+        # Only the last position's logits are needed while decoding
+        forward_params = inspect.signature(self._model.forward).parameters
+        self._logits_kwargs = {}
+        for name in ("logits_to_keep", "num_logits_to_keep"):
+            if name in forward_params:
+                self._logits_kwargs = {name: 1}
+                break
 
     def close(self) -> None:
         if self._model is None:
@@ -50,41 +101,288 @@ class MAPModelRunner:
         del self._tokenizer
         self._model = None
         self._tokenizer = None
+        if self.prefix_cache is not None:
+            self.prefix_cache.clear()
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
         gc.collect()
 
     # ------------- MAP primitives -------------
 
-    def get_layer_trajectories(self, prompts: List[str]) -> List[np.ndarray]:
+    def get_layer_trajectories(
+        self,
+        prompts: List[str],
+        batch_size: int = 1,
+        max_batch_tokens: Optional[int] = None,
+        layers: Optional[Sequence[int]] = None,
+        token_index: int = -1,
+        pooling: Optional[str] = None,
+        early_exit: bool = True,
+        out: Optional[np.ndarray] = None,
+        return_array: bool = False,
+    ) -> Union[List[np.ndarray], np.ndarray]:
         """
         MAP convergence experiment:
         For each prompt, run a single forward pass and collect
         the last-token vector at every layer.
 
+        Prompts are bucketed by token length and run in left-padded batches
+        with an attention mask, so the last position of every row is the
+        last real token and the result matches the one-prompt-per-pass loop.
+        Forward hooks reduce each requested layer to one vector per prompt
+        on the device, so full (batch, seq, dim) hidden states are never kept.
+
+        Parameters
+        ----------
+        prompts : list of str
+        batch_size : int
+            Maximum number of prompts per forward pass. The default of 1
+            reproduces the unbatched behaviour.
+        max_batch_tokens : int, optional
+            Token budget per forward pass (padded length x rows). When set,
+            batches are grown until either limit is reached.
+        layers : sequence of int, optional
+            Hidden-state indices to keep (0 = embeddings, -1 = final layer).
+            Defaults to all of them.
+        token_index : int
+            Token to keep, counted over real tokens (-1 = last, 0 = first).
+        pooling : {None, "mean", "max"}
+            Pool over the prompt's tokens instead of selecting one.
+        early_exit : bool
+            Stop each forward pass after the deepest requested layer.
+        out : np.ndarray, optional
+            Preallocated (num_prompts, num_selected_layers, hidden_dim) buffer
+            to fill, e.g. an np.memmap. Allocated as float32 if not given.
+        return_array : bool
+            Return the filled buffer instead of a list of per-prompt views.
+
         Returns
         -------
-        trajectories : list of (num_layers, hidden_dim) arrays
+        trajectories : list of (num_selected_layers, hidden_dim) arrays, in prompt order.
+            Each entry is a view into one contiguous buffer, so stacking them
+            again is unnecessary: pass `return_array=True` to get the buffer.
         """
-        self.load()
-        model, tokenizer = self._model, self._tokenizer
-
-        trajectories: List[np.ndarray] = []
         print(f"[MAP] Getting layer trajectories for {len(prompts)} prompts")
+        start_time = time.perf_counter()
+
+        keys: Optional[List[str]] = None
+        cached: Dict[int, np.ndarray] = {}
+        if self.cache is not None:
+            keys = [
+                self._cache_key(
+                    "layers", prompt=p, layers=layers, token_index=token_index, pooling=pooling
+                )
+                for p in prompts
+            ]
+            for idx, key in enumerate(keys):
+                hit = self.cache.get(key)
+                if hit is not None:
+                    cached[idx] = hit
+        missing = [i for i in range(len(prompts)) if i not in cached]
+
+        if missing or not cached:
+            self.load()
+            if layers is None:
+                layers = list(range(self._model.config.num_hidden_layers + 1))
+            shape = (len(prompts), len(layers), self._model.config.hidden_size)
+        else:
+            shape = (len(prompts),) + next(iter(cached.values())).shape
+        if out is None:
+            out = np.empty(shape, dtype=np.float32)
+        elif out.shape != shape:
+            raise ValueError(f"out has shape {out.shape}, expected {shape}")
+
+        for idx, hit in cached.items():
+            out[idx] = hit
+
+        num_batches = 0
+        if missing:
+            num_batches = self._extract_layers(
+                [prompts[i] for i in missing],
+                missing,
+                out,
+                batch_size=batch_size,
+                max_batch_tokens=max_batch_tokens,
+                layers=layers,
+                token_index=token_index,
+                pooling=pooling,
+                early_exit=early_exit,
+            )
+            if keys is not None:
+                for idx in missing:
+                    self.cache.put(keys[idx], out[idx])
+
+        self._record_throughput(len(prompts), num_batches, start_time)
+        if return_array:
+            return out
+        return list(out)
+
+    def iter_layer_trajectories(
+        self,
+        prompts: Iterable[str],
+        chunk_size: int = 256,
+        **kwargs: Any,
+    ) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """
+        Streaming variant of get_layer_trajectories for large corpora.
+
+        Prompts are pulled from `prompts` (any iterable, e.g. a file reader)
+        `chunk_size` at a time, so memory stays flat regardless of corpus size.
+        Feed the stream to `ShardWriter.write_stream` to persist it.
+
+        Parameters
+        ----------
+        prompts : iterable of str
+        chunk_size : int
+            Prompts per yielded chunk; each chunk is further split into
+            forward passes by `batch_size` / `max_batch_tokens`.
+        **kwargs
+            Forwarded to get_layer_trajectories (batch_size, layers, pooling, ...).
+
+        Yields
+        ------
+        (prompts_chunk, trajectories) with trajectories of shape
+        (len(prompts_chunk), num_selected_layers, hidden_dim)
+        """
+        if "out" in kwargs or "return_array" in kwargs:
+            raise TypeError("iter_layer_trajectories allocates one buffer per chunk itself")
+
+        chunk: List[str] = []
+        for prompt in prompts:
+            chunk.append(prompt)
+            if len(chunk) >= chunk_size:
+                yield chunk, self.get_layer_trajectories(chunk, return_array=True, **kwargs)
+                chunk = []
+        if chunk:
+            yield chunk, self.get_layer_trajectories(chunk, return_array=True, **kwargs)
+
+    def _extract_layers(
+        self,
+        prompts: Sequence[str],
+        rows: Sequence[int],
+        out: np.ndarray,
+        batch_size: int = 1,
+        max_batch_tokens: Optional[int] = None,
+        layers: Sequence[int] = (-1,),
+        token_index: int = -1,
+        pooling: Optional[str] = None,
+        early_exit: bool = True,
+    ) -> int:
+        """
+        Run the model over `prompts` and write prompt j's vectors to out[rows[j]].
+
+        Returns the number of forward passes.
+        """
+        encoded = self._tokenizer(list(prompts))["input_ids"]
+        batches = _bucket_by_length(
+            [len(ids) for ids in encoded], batch_size, max_batch_tokens
+        )
+        capture = self._layer_capture(layers, token_index, pooling, early_exit)
+        rows = np.asarray(rows)
+
+        for batch in batches:
+            input_ids, attention_mask, position_ids = _left_pad(
+                [encoded[i] for i in batch], self._pad_token_id(), self.device
+            )
+            with torch.inference_mode():
+                if capture is not None:
+                    with capture:
+                        capture.run(
+                            input_ids=input_ids,
+                            attention_mask=attention_mask,
+                            position_ids=position_ids,
+                        )
+                    vectors = capture.stacked()
+                else:
+                    outputs = self._model(
+                        input_ids=input_ids,
+                        attention_mask=attention_mask,
+                        position_ids=position_ids,
+                        output_hidden_states=True,
+                    )
+                    vectors = torch.stack(
+                        [
+                            select_tokens(outputs.hidden_states[i], attention_mask, token_index, pooling)
+                            for i in layers
+                        ],
+                        dim=1,
+                    )
+
+            # One device-to-host copy per batch: (batch, num_selected_layers, dim)
+            out[rows[batch]] = vectors.detach().to("cpu", torch.float32).numpy()
+
+        return len(batches)
 
-        for p in prompts:
-            inputs = tokenizer(p, return_tensors="pt").to(self.device)
-            with torch.no_grad():
-                outputs = model(**inputs)
+    def _cache_key(self, kind: str, **fields) -> str:
+        return TrajectoryCache.make_key(
+            kind=kind,
+            model=self.model_name,
+            revision=self.revision,
+            dtype=str(self._resolved_dtype()),
+            # int8 weights change the results; unquantized keys stay as before
+            **({"quantize": self.execution.quantize} if self.execution.quantize else {}),
+            **fields,
+        )
 
-            traj = []
-            for layer_out in outputs.hidden_states:
-                # (batch, seq, dim) -> last token of first example
-                vec = layer_out[0, -1, :].detach().cpu().numpy().astype("float32")
-                traj.append(vec)
-            trajectories.append(np.stack(traj, axis=0))
+    def _resolved_dtype(self) -> torch.dtype:
+        """
+        Concrete dtype, with torch_dtype="auto" resolved to the checkpoint's,
+        so cache keys do not depend on how the dtype was requested.
+        """
+        if self.torch_dtype != "auto":
+            return self.torch_dtype
+        if self._model is not None:
+            return next(self._model.parameters()).dtype
+        if self._auto_dtype is None:
+            config = AutoConfig.from_pretrained(self.model_name, revision=self.revision)
+            dtype = getattr(config, "dtype", None) or getattr(config, "torch_dtype", None)
+            if isinstance(dtype, str):
+                dtype = getattr(torch, dtype)
+            self._auto_dtype = dtype or torch.float32
+        return self._auto_dtype
+
+    def _layer_capture(
+        self,
+        layers: Sequence[int],
+        token_index: int = -1,
+        pooling: Optional[str] = None,
+        early_exit: bool = False,
+    ) -> Optional[LayerCapture]:
+        """
+        Hook-based capture for the loaded model, or None if its decoder
+        blocks cannot be located (callers then fall back to output_hidden_states).
+        """
+        try:
+            return LayerCapture(
+                self._model.base_model,
+                layers,
+                token_index=token_index,
+                pooling=pooling,
+                early_exit=early_exit,
+            )
+        except ValueError:
+            return None
+
+    def _pad_token_id(self) -> int:
+        tokenizer = self._tokenizer
+        if tokenizer.pad_token_id is not None:
+            return tokenizer.pad_token_id
+        if tokenizer.eos_token_id is not None:
+            return tokenizer.eos_token_id
+        return 0
 
-        return trajectories
+    def _record_throughput(self, num_prompts: int, num_batches: int, start_time: float) -> None:
+        elapsed = max(time.perf_counter() - start_time, 1e-9)
+        self.last_run_stats = {
+            "prompts": num_prompts,
+            "batches": num_batches,
+            "seconds": elapsed,
+            "prompts_per_sec": num_prompts / elapsed,
+        }
+        print(
+            f"[MAP] Processed {num_prompts} prompts in {num_batches} batches, "
+            f"{elapsed:.2f}s ({num_prompts / elapsed:.1f} prompts/sec)"
+        )
 
     def generate_trajectory(
         self,
@@ -92,6 +390,7 @@ class MAPModelRunner:
         user_prompt: str,
         num_steps: int = 20,
         generation_kwargs: Optional[Dict] = None,
+        monitor: Optional[CurvatureMonitor] = None,
     ) -> np.ndarray:
         """
         MAP safety experiment:
@@ -106,30 +405,275 @@ class MAPModelRunner:
             Number of generation steps to observe.
         generation_kwargs : dict
             Passed through to model (e.g., temperature, top_p).
+        monitor : CurvatureMonitor, optional
+            Reset, then fed every step's hidden state; decoding stops as soon
+            as it triggers (see monitor.trigger_step). Bypasses the cache.
+
+        Returns
+        -------
+        traj : (num_steps, hidden_dim) array, fewer rows if the monitor stopped early
+        """
+        key = None
+        if self.cache is not None and monitor is None:
+            key = self._cache_key(
+                "rollout",
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                num_steps=num_steps,
+                generation_kwargs=generation_kwargs or {},
+            )
+            hit = self.cache.get(key)
+            if hit is not None:
+                return np.array(hit, dtype=np.float32)
+
+        self.load()
+        text = _format_chat(system_prompt, user_prompt)
+        input_ids = self._tokenizer(text)["input_ids"]
+        if monitor is not None:
+            monitor.reset()
+        hidden, _ = self._decode_batch(
+            [input_ids], num_steps, generation_kwargs, prefix_text=system_prompt, monitor=monitor
+        )
+        if key is not None:
+            self.cache.put(key, hidden[0])
+        return hidden[0]
+
+    def generate_trajectories(
+        self,
+        pairs: Sequence[Tuple[str, str]],
+        num_steps: int = 20,
+        batch_size: int = 16,
+        generation_kwargs: Optional[Dict] = None,
+        out: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Batched MAP safety experiment:
+        Greedy rollouts for many (system_prompt, user_prompt) pairs at once.
+
+        Prompts are bucketed by length and decoded together in left-padded
+        batches. The attention mask and per-row position ids keep every
+        rollout identical to a separate generate_trajectory call.
+
+        Parameters
+        ----------
+        pairs : sequence of (system_prompt, user_prompt)
+        num_steps : int
+            Number of generation steps to observe.
+        batch_size : int
+            Maximum number of rollouts decoded together.
+        generation_kwargs : dict
+            Passed through to model.
+        out : np.ndarray, optional
+            Preallocated (num_pairs, num_steps, hidden_dim) buffer to fill,
+            e.g. an np.memmap. Allocated as float32 if not given.
 
         Returns
         -------
-        traj : (num_steps, hidden_dim) array
+        trajs : (num_pairs, num_steps, hidden_dim) array
+        token_ids : (num_pairs, num_steps) array of generated token ids
         """
         self.load()
-        model, tokenizer = self._model, self._tokenizer
+        tokenizer = self._tokenizer
+
+        print(f"[MAP] Generating {len(pairs)} trajectories of {num_steps} steps")
+        start_time = time.perf_counter()
+
+        encoded = tokenizer([_format_chat(s, u) for s, u in pairs])["input_ids"]
+
+        # Rollouts sharing a system prompt are batched together so they can
+        # branch from the same cached prefix.
+        groups: Dict[str, List[int]] = {}
+        for idx, (system_prompt, _) in enumerate(pairs):
+            groups.setdefault(system_prompt, []).append(idx)
+
+        batches: List[Tuple[str, List[int]]] = []
+        for system_prompt, members in groups.items():
+            for bucket in _bucket_by_length([len(encoded[i]) for i in members], batch_size):
+                batches.append((system_prompt, [members[j] for j in bucket]))
+
+        shape = (len(pairs), num_steps, self._model.config.hidden_size)
+        if out is None:
+            out = np.empty(shape, dtype=np.float32)
+        elif out.shape != shape:
+            raise ValueError(f"out has shape {out.shape}, expected {shape}")
+
+        token_ids = np.zeros((len(pairs), num_steps), dtype=np.int64)
+        for system_prompt, batch in batches:
+            hidden, tokens = self._decode_batch(
+                [encoded[i] for i in batch],
+                num_steps,
+                generation_kwargs,
+                prefix_text=system_prompt,
+            )
+            out[batch] = hidden
+            token_ids[batch] = tokens
+
+        self._record_throughput(len(pairs), len(batches), start_time)
+        return out, token_ids
+
+    def _decode_batch(
+        self,
+        sequences: Sequence[Sequence[int]],
+        num_steps: int,
+        generation_kwargs: Optional[Dict] = None,
+        prefix_text: Optional[str] = None,
+        monitor: Optional[CurvatureMonitor] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Greedy KV-cached decoding for a batch of tokenized prompts.
+
+        The first step encodes the left-padded prompts; later steps feed only
+        the newest token per row and reuse the KV cache, so each step costs
+        O(seq) not O(seq^2). If `prefix_text` is given and the prefix cache is
+        enabled, the tokens shared with the cached prefix are not re-encoded:
+        rows branch from a copy of its KV state and only their suffixes are
+        left-padded after it.
+
+        If a `monitor` is given, every step's hidden states are copied to the
+        host and fed to it, and decoding stops once all rows have triggered.
+
+        Returns last-layer last-token hidden states of shape
+        (batch, num_steps, dim) and the chosen token ids (batch, num_steps).
+        """
+        model = self._model
         generation_kwargs = generation_kwargs or {}
 
-        text = system_prompt + "\n\nUser: " + user_prompt + "\n\nAssistant:"
-        inputs = tokenizer(text, return_tensors="pt").to(self.device)
+        prefix_len, past_key_values = 0, None
+        if prefix_text is not None and self.prefix_cache is not None:
+            prefix_ids, prefix_kv = self._prefix_state(prefix_text)
+            prefix_len = shared_prefix_length(sequences, prefix_ids)
+            if prefix_len > 0:
+                past_key_values = branch_kv(prefix_kv, prefix_len, len(sequences))
 
-        current_ids = inputs.input_ids
-        trajectory = []
+        current_ids, attention_mask, position_ids = _left_pad(
+            [seq[prefix_len:] for seq in sequences], self._pad_token_id(), self.device
+        )
+        if prefix_len > 0:
+            position_ids = position_ids + prefix_len
+            attention_mask = torch.cat(
+                [attention_mask.new_ones((len(sequences), prefix_len)), attention_mask], dim=1
+            )
+        hidden_steps, token_steps = [], []
 
+        # Only the final-norm output is hooked, instead of materializing every layer
+        capture = self._layer_capture([-1])
         for _ in range(num_steps):
-            with torch.no_grad():
-                outputs = model(current_ids, output_hidden_states=True, **generation_kwargs)
+            with torch.inference_mode():
+                model_kwargs = dict(
+                    input_ids=current_ids,
+                    attention_mask=attention_mask,
+                    position_ids=position_ids,
+                    past_key_values=past_key_values,
+                    use_cache=True,
+                    output_hidden_states=capture is None,
+                )
+                model_kwargs.update(self._logits_kwargs)
+                model_kwargs.update(generation_kwargs)
+                if capture is not None:
+                    capture.attention_mask = attention_mask
+                    with capture:
+                        outputs = model(**model_kwargs)
+                    hidden_steps.append(capture.stacked()[:, 0])
+                else:
+                    outputs = model(**model_kwargs)
+                    hidden_steps.append(outputs.hidden_states[-1][:, -1, :])
+
+            # greedy next token, one per row
+            next_token = torch.argmax(outputs.logits[:, -1, :], dim=-1, keepdim=True)
+            token_steps.append(next_token)
+            past_key_values = outputs.past_key_values
+            current_ids = next_token
+            position_ids = position_ids[:, -1:] + 1
+            attention_mask = torch.cat(
+                [attention_mask, attention_mask.new_ones((attention_mask.shape[0], 1))], dim=1
+            )
+            if monitor is not None and monitor.update(hidden_steps[-1].float().cpu().numpy()):
+                break
+
+        hidden = torch.stack(hidden_steps, dim=1).detach().float().cpu().numpy()
+        tokens = torch.cat(token_steps, dim=1).cpu().numpy()
+        return hidden, tokens
+
+
+    def _prefix_state(self, text: str) -> Tuple[List[int], object]:
+        """
+        Token ids and KV state of a prompt prefix, encoded once per distinct text.
+        """
+        cached = self.prefix_cache.get(text)
+        if cached is not None:
+            return cached
+
+        prefix_ids = self._tokenizer(text)["input_ids"]
+        past_key_values = None
+        if len(prefix_ids) > 0:
+            input_ids = torch.as_tensor([prefix_ids], dtype=torch.long, device=self.device)
+            with torch.inference_mode():
+                # The base model yields the KV state without computing prefix logits
+                outputs = self._model.base_model(input_ids=input_ids, use_cache=True)
+            past_key_values = outputs.past_key_values
+            self.prefix_cache.put(text, prefix_ids, past_key_values)
+        return prefix_ids, past_key_values
+
 
-            last_hidden = outputs.hidden_states[-1][0, -1, :].detach().cpu().numpy()
-            trajectory.append(last_hidden)
+def _format_chat(system_prompt: str, user_prompt: str) -> str:
+    return system_prompt + "\n\nUser: " + user_prompt + "\n\nAssistant:"
 
-            # greedy next token
-            next_token = torch.argmax(outputs.logits[:, -1, :], dim=-1).unsqueeze(0)
-            current_ids = torch.cat([current_ids, next_token], dim=1)
 
-        return np.stack(trajectory, axis=0)
+# ------------- batching helpers -------------
+
+
+def _bucket_by_length(
+    lengths: Sequence[int],
+    batch_size: int = 1,
+    max_batch_tokens: Optional[int] = None,
+) -> List[List[int]]:
+    """
+    Group item indices into batches of similar length to limit padding waste.
+
+    Items are sorted by length and packed greedily; a batch is closed when it
+    holds `batch_size` items or when adding another item would push the padded
+    size (longest length x rows) past `max_batch_tokens`. An item longer than
+    the budget still gets a batch of its own.
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be >= 1, got {batch_size}")
+
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches: List[List[int]] = []
+    current: List[int] = []
+    for idx in order:
+        if current:
+            padded = lengths[idx] * (len(current) + 1)
+            too_many = len(current) >= batch_size
+            too_big = max_batch_tokens is not None and padded > max_batch_tokens
+            if too_many or too_big:
+                batches.append(current)
+                current = []
+        current.append(idx)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _left_pad(
+    sequences: Sequence[Sequence[int]],
+    pad_token_id: int,
+    device: str,
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Left-pad token id lists into (input_ids, attention_mask, position_ids).
+
+    Position ids count real tokens only, so every row sees the same positions
+    it would get when run on its own.
+    """
+    max_len = max(len(s) for s in sequences)
+    input_ids = torch.full((len(sequences), max_len), pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(sequences), max_len), dtype=torch.long)
+    for row, seq in enumerate(sequences):
+        if len(seq) == 0:
+            continue
+        input_ids[row, max_len - len(seq):] = torch.as_tensor(list(seq), dtype=torch.long)
+        attention_mask[row, max_len - len(seq):] = 1
+
+    position_ids = (attention_mask.cumsum(dim=1) - 1).clamp(min=0)
+    return input_ids.to(device), attention_mask.to(device), position_ids.to(device)
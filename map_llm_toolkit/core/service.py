@@ -0,0 +1,167 @@
+"""
+Asyncio front end with dynamic batching around MAPModelRunner.
+
+Several analysis clients can await `ExtractionService.extract(prompt)`
+concurrently. Requests are queued, and a background batcher groups
+everything that arrives within `max_latency_ms` (up to `max_batch_size`
+requests) into one `get_layer_trajectories` call. That call buckets the
+batch by token length, so each forward pass holds similarly sized prompts.
+"""
+
+import asyncio
+import concurrent.futures
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .runner import MAPModelRunner
+
+_LayersKey = Optional[Tuple[int, ...]]
+
+
+class ExtractionService:
+    """
+    Dynamic-batching extraction service for one runner.
+
+    Parameters
+    ----------
+    runner : MAPModelRunner
+        Runner (or RunnerPool) executing the batches. Batches run one at a
+        time in a worker thread, so the event loop stays responsive.
+    max_batch_size : int
+        Maximum requests merged into one batch.
+    max_latency_ms : float
+        How long the first request of a batch waits for others to join.
+    batch_size, max_batch_tokens :
+        Per-forward-pass limits passed to get_layer_trajectories.
+
+    Usage
+    -----
+        async with ExtractionService(runner) as service:
+            traj = await service.extract("What is justice?", layers=[0, -1])
+    """
+
+    def __init__(
+        self,
+        runner: MAPModelRunner,
+        max_batch_size: int = 64,
+        max_latency_ms: float = 10.0,
+        batch_size: int = 16,
+        max_batch_tokens: Optional[int] = None,
+    ) -> None:
+        self.runner = runner
+        self.max_batch_size = max_batch_size
+        self.max_latency_ms = max_latency_ms
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+
+        self.stats: Dict[str, float] = {"requests": 0, "batches": 0, "busy_seconds": 0.0}
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+    # ------------- lifecycle -------------
+
+    async def start(self) -> None:
+        if self._batcher is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._batcher = asyncio.ensure_future(self._run_batcher())
+
+    async def stop(self) -> None:
+        """Finish every queued request, then stop the batcher."""
+        if self._batcher is None:
+            return
+        await self._queue.put(None)
+        await self._batcher
+        self._executor.shutdown(wait=True)
+        self._batcher, self._queue, self._executor = None, None, None
+
+    async def __aenter__(self) -> "ExtractionService":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    # ------------- API -------------
+
+    async def extract(self, prompt: str, layers: Optional[Sequence[int]] = None) -> np.ndarray:
+        """
+        Layer trajectory of one prompt, shape (num_selected_layers, hidden_dim).
+        """
+        if self._batcher is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        key: _LayersKey = tuple(layers) if layers is not None else None
+        await self._queue.put((prompt, key, future))
+        return await future
+
+    # ------------- batching -------------
+
+    async def _run_batcher(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+
+            # Collect whatever else arrives within the latency window
+            deadline = loop.time() + self.max_latency_ms / 1000.0
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            # Requests with different layer selections cannot share a call
+            groups: Dict[_LayersKey, List[Tuple[str, asyncio.Future]]] = {}
+            for prompt, key, future in batch:
+                groups.setdefault(key, []).append((prompt, future))
+            for key, requests in groups.items():
+                await self._run_group(loop, key, requests)
+
+    async def _run_group(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        layers: _LayersKey,
+        requests: List[Tuple[str, asyncio.Future]],
+    ) -> None:
+        prompts = [prompt for prompt, _ in requests]
+        start_time = time.perf_counter()
+        try:
+            result = await loop.run_in_executor(
+                self._executor,
+                lambda: self.runner.get_layer_trajectories(
+                    prompts,
+                    batch_size=self.batch_size,
+                    max_batch_tokens=self.max_batch_tokens,
+                    layers=list(layers) if layers is not None else None,
+                    return_array=True,
+                ),
+            )
+        except Exception as exc:
+            for _, future in requests:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        finally:
+            self.stats["busy_seconds"] += time.perf_counter() - start_time
+            self.stats["batches"] += 1
+            self.stats["requests"] += len(requests)
+
+        for row, (_, future) in enumerate(requests):
+            if not future.done():
+                future.set_result(result[row])
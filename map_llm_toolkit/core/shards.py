@@ -0,0 +1,182 @@
+"""
+Size-bounded on-disk shards for streamed MAP trajectories.
+
+ShardWriter consumes the batches yielded by
+`MAPModelRunner.iter_layer_trajectories` and writes them as `.npy` shards
+next to an `index.json`. The index is rewritten after every shard, so an
+interrupted job keeps everything written so far and can resume from
+`writer.num_items`. ShardReader streams the shards back as memory-mapped
+arrays without ever concatenating them.
+"""
+
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+INDEX_FILE = "index.json"
+
+
+class ShardWriter:
+    """
+    Stream (num_items, ...) batches into `.npy` shards of at most `max_shard_bytes`.
+
+    Opening an existing shard directory appends to it. Use as a context
+    manager (or call `close()`) to flush the last partial shard.
+    """
+
+    def __init__(self, directory: str, max_shard_bytes: int = 1 << 30) -> None:
+        self.directory = directory
+        self.max_shard_bytes = int(max_shard_bytes)
+        os.makedirs(directory, exist_ok=True)
+
+        self._index = _read_index(directory) or {
+            "num_items": 0,
+            "item_shape": None,
+            "dtype": None,
+            "shards": [],
+        }
+        self._pending: List[np.ndarray] = []
+        self._pending_prompts: List[str] = []
+        self._pending_bytes = 0
+
+    @property
+    def num_items(self) -> int:
+        """Items already flushed to disk (safe resume point)."""
+        return self._index["num_items"]
+
+    def write(self, trajectories: np.ndarray, prompts: Optional[Sequence[str]] = None) -> None:
+        """
+        Append one batch of trajectories, flushing full shards to disk.
+        """
+        trajectories = np.asarray(trajectories)
+        if len(trajectories) == 0:
+            return
+        item_shape = list(trajectories.shape[1:])
+        if self._index["item_shape"] is None:
+            self._index["item_shape"] = item_shape
+            self._index["dtype"] = trajectories.dtype.str
+        elif self._index["item_shape"] != item_shape:
+            raise ValueError(
+                f"item shape {item_shape} does not match shard shape {self._index['item_shape']}"
+            )
+
+        item_bytes = max(trajectories[0].nbytes, 1)
+        start = 0
+        while start < len(trajectories):
+            room = max((self.max_shard_bytes - self._pending_bytes) // item_bytes, 1)
+            part = trajectories[start:start + room]
+            self._pending.append(part)
+            if prompts is not None:
+                self._pending_prompts.extend(prompts[start:start + len(part)])
+            self._pending_bytes += part.nbytes
+            start += len(part)
+            if self._pending_bytes + item_bytes > self.max_shard_bytes:
+                self.flush()
+
+    def write_stream(self, stream: Iterable[Tuple[Sequence[str], np.ndarray]]) -> None:
+        """
+        Consume a `(prompts, trajectories)` stream such as `iter_layer_trajectories`.
+        """
+        for prompts, trajectories in stream:
+            self.write(trajectories, prompts)
+        self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        data = np.concatenate(self._pending, axis=0).astype(self._index["dtype"], copy=False)
+        stem = f"shard_{len(self._index['shards']):05d}"
+        np.save(os.path.join(self.directory, stem + ".npy"), data)
+        shard = {"file": stem + ".npy", "start": self._index["num_items"], "count": len(data)}
+
+        if self._pending_prompts:
+            shard["prompts"] = stem + ".prompts.jsonl"
+            with open(os.path.join(self.directory, shard["prompts"]), "w", encoding="utf-8") as f:
+                for prompt in self._pending_prompts:
+                    f.write(json.dumps(prompt) + "\n")
+
+        # The index is written last, so it only ever lists complete shards
+        self._index["shards"].append(shard)
+        self._index["num_items"] += len(data)
+        _write_index(self.directory, self._index)
+
+        self._pending, self._pending_prompts, self._pending_bytes = [], [], 0
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> "ShardWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ShardReader:
+    """
+    Re-iterable view over a shard directory written by ShardWriter.
+
+    Iterating yields one memory-mapped (count, ...) array per shard, so
+    memory use stays flat and the reader can be passed around like any
+    other stream of trajectory batches. It is a stream, not a sequence:
+    use `num_items` and `item(i)` for counts and random access.
+    compute_alignment_profile, project_pca and TrajectoryDataset.write
+    consume it shard by shard.
+    """
+
+    def __init__(self, directory: str) -> None:
+        index = _read_index(directory)
+        if index is None:
+            raise FileNotFoundError(f"No {INDEX_FILE} in {directory}")
+        self.directory = directory
+        self.index = index
+
+    @property
+    def num_items(self) -> int:
+        """Items across all shards."""
+        return self.index["num_items"]
+
+    @property
+    def item_shape(self) -> Tuple[int, ...]:
+        return tuple(self.index["item_shape"] or ())
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for shard in self.index["shards"]:
+            yield np.load(os.path.join(self.directory, shard["file"]), mmap_mode="r")
+
+    def item(self, i: int) -> np.ndarray:
+        """Item `i` across shards, memory-mapped."""
+        if i < 0:
+            i += self.num_items
+        for shard in self.index["shards"]:
+            if shard["start"] <= i < shard["start"] + shard["count"]:
+                data = np.load(os.path.join(self.directory, shard["file"]), mmap_mode="r")
+                return data[i - shard["start"]]
+        raise IndexError(i)
+
+    def prompts(self) -> Iterator[str]:
+        """Prompts in item order, for shards written with prompts."""
+        for shard in self.index["shards"]:
+            if "prompts" not in shard:
+                continue
+            with open(os.path.join(self.directory, shard["prompts"]), encoding="utf-8") as f:
+                for line in f:
+                    yield json.loads(line)
+
+
+def _read_index(directory: str) -> Optional[Dict]:
+    path = os.path.join(directory, INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_index(directory: str, index: Dict) -> None:
+    path = os.path.join(directory, INDEX_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, path)
@@ -0,0 +1,199 @@
+"""
+Blockwise pairwise-similarity analytics per layer.
+
+compute_alignment_profile only needs the mean pairwise cosine. For outlier
+and near-duplicate hunting we also want the full distribution of pairwise
+cosines and every prompt's nearest neighbours, on corpora where the
+N × N similarity matrix cannot be materialized. similarity_analytics
+streams over (row block × column block) tiles of the normalized layer
+vectors and keeps only running histograms and per-row top-k candidates,
+so its memory is bounded by the tile size.
+"""
+
+import concurrent.futures
+import math
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .dataset import TrajectoryDataset
+
+
+def similarity_analytics(
+    trajectories: Sequence[np.ndarray],
+    layers: Optional[Sequence[int]] = None,
+    k: int = 10,
+    bins: int = 100,
+    max_memory_bytes: int = 256 << 20,
+    block_size: Optional[int] = None,
+    n_jobs: int = 1,
+) -> Dict[str, np.ndarray]:
+    """
+    Per-layer pairwise cosine histograms and top-k nearest neighbours.
+
+    Parameters
+    ----------
+    trajectories:
+        Sequence of (num_layers, dim) arrays, one (N, num_layers, dim)
+        array or a TrajectoryDataset. np.memmap and dataset input is read
+        block by block, one layer at a time.
+    layers:
+        Layer indices to analyse. Defaults to all.
+    k:
+        Neighbours kept per prompt (self-similarity excluded).
+    bins:
+        Histogram bins over [-1, 1]. Only pairs i < j are counted.
+    max_memory_bytes:
+        Ceiling for the working set of all concurrently processed tiles.
+        Ignored when `block_size` is given.
+    block_size:
+        Rows / columns per tile.
+    n_jobs:
+        Threads processing row blocks in parallel (BLAS releases the GIL).
+
+    Returns
+    -------
+    result : dict with keys
+        "layers"        (num_selected,) analysed layer indices
+        "bin_edges"     (bins + 1,) histogram edges
+        "histograms"    (num_selected, bins) pair counts
+        "topk_indices"  (num_selected, N, k) neighbour indices, most similar first (-1 if fewer than k)
+        "topk_scores"   (num_selected, N, k) neighbour cosines (-inf if fewer than k)
+    """
+    num_prompts = len(trajectories)
+    num_layers, dim = np.shape(trajectories[0])
+    layers = list(range(num_layers)) if layers is None else [l % num_layers for l in layers]
+    k = max(0, min(k, num_prompts - 1))
+    n_jobs = max(1, n_jobs)
+
+    if block_size is None:
+        block_size = _block_size_for_budget(max_memory_bytes // n_jobs, dim, k)
+    block_size = max(1, min(block_size, num_prompts))
+    blocks = [(s, min(s + block_size, num_prompts)) for s in range(0, num_prompts, block_size)]
+
+    histograms = np.zeros((len(layers), bins), dtype=np.int64)
+    topk_indices = np.full((len(layers), num_prompts, k), -1, dtype=np.int64)
+    topk_scores = np.full((len(layers), num_prompts, k), -np.inf, dtype=np.float32)
+
+    for out_idx, layer in enumerate(layers):
+        inv_norms = _inverse_norms(trajectories, layer, block_size)
+
+        def load_block(start: int, end: int) -> np.ndarray:
+            block = np.asarray(_layer_chunk(trajectories, start, end, layer), dtype=np.float32)
+            return block * inv_norms[start:end, None]
+
+        def process_row_block(row_range: Tuple[int, int]) -> Tuple[int, np.ndarray, np.ndarray, np.ndarray]:
+            row_start, row_end = row_range
+            rows = load_block(row_start, row_end)
+            state = _RowBlockState(row_start, row_end, k, bins)
+            for col_start, col_end in blocks:
+                cols = rows if col_start == row_start else load_block(col_start, col_end)
+                state.update(rows @ cols.T, col_start)
+            return row_start, state.hist, *state.finalize()
+
+        if n_jobs == 1:
+            results = map(process_row_block, blocks)
+        else:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=n_jobs)
+            results = executor.map(process_row_block, blocks)
+
+        for row_start, hist, idx, scores in results:
+            histograms[out_idx] += hist
+            topk_indices[out_idx, row_start:row_start + len(idx)] = idx
+            topk_scores[out_idx, row_start:row_start + len(idx)] = scores
+
+        if n_jobs > 1:
+            executor.shutdown(wait=True)
+
+    return {
+        "layers": np.asarray(layers, dtype=np.int32),
+        "bin_edges": np.linspace(-1.0, 1.0, bins + 1),
+        "histograms": histograms,
+        "topk_indices": topk_indices,
+        "topk_scores": topk_scores,
+    }
+
+
+class _RowBlockState:
+    """
+    Running histogram and top-k candidates for one block of rows.
+    """
+
+    def __init__(self, row_start: int, row_end: int, k: int, bins: int) -> None:
+        self.row_start, self.row_end = row_start, row_end
+        self.k, self.bins = k, bins
+        n_rows = row_end - row_start
+        self.hist = np.zeros(bins, dtype=np.int64)
+        self.top_scores = np.full((n_rows, k), -np.inf, dtype=np.float32)
+        self.top_indices = np.full((n_rows, k), -1, dtype=np.int64)
+
+    def update(self, sims: np.ndarray, col_start: int) -> None:
+        n_rows, n_cols = sims.shape
+        col_ids = np.arange(col_start, col_start + n_cols)
+        row_ids = np.arange(self.row_start, self.row_end)
+
+        # Histogram over pairs i < j only
+        if col_start + n_cols > self.row_start + 1:
+            if col_start >= self.row_end:
+                upper = sims.ravel()
+            else:
+                upper = sims[row_ids[:, None] < col_ids[None, :]]
+            codes = ((np.clip(upper, -1.0, 1.0) + 1.0) * (self.bins / 2.0)).astype(np.int64)
+            self.hist += np.bincount(np.minimum(codes, self.bins - 1), minlength=self.bins)
+
+        if self.k == 0:
+            return
+        # Top-k: exclude self-similarity, then merge the tile into the running candidates
+        if col_start < self.row_end and col_start + n_cols > self.row_start:
+            sims = sims.copy()
+            sims[row_ids[:, None] == col_ids[None, :]] = -np.inf
+        cand_scores = np.concatenate([self.top_scores, sims.astype(np.float32)], axis=1)
+        cand_indices = np.concatenate(
+            [self.top_indices, np.broadcast_to(col_ids, (n_rows, n_cols))], axis=1
+        )
+        keep = np.argpartition(-cand_scores, self.k - 1, axis=1)[:, : self.k]
+        self.top_scores = np.take_along_axis(cand_scores, keep, axis=1)
+        self.top_indices = np.take_along_axis(cand_indices, keep, axis=1)
+
+    def finalize(self) -> Tuple[np.ndarray, np.ndarray]:
+        order = np.argsort(-self.top_scores, axis=1, kind="stable")
+        scores = np.take_along_axis(self.top_scores, order, axis=1)
+        indices = np.take_along_axis(self.top_indices, order, axis=1)
+        indices[~np.isfinite(scores)] = -1
+        return indices, scores
+
+
+def _layer_chunk(trajectories: Sequence[np.ndarray], start: int, end: int, layer: int) -> np.ndarray:
+    """
+    One layer of rows [start, end) as a (n, dim) array, without reading the other layers.
+    """
+    if isinstance(trajectories, np.ndarray):
+        return trajectories[start:end, layer]
+    if isinstance(trajectories, TrajectoryDataset):
+        return trajectories.stacked(start, end, layer=layer)
+    return np.stack([t[layer] for t in trajectories[start:end]], axis=0)
+
+
+def _inverse_norms(trajectories: Sequence[np.ndarray], layer: int, chunk: int) -> np.ndarray:
+    """
+    1 / (||x_i|| + eps) for every prompt at one layer, read chunk by chunk.
+    """
+    num_prompts = len(trajectories)
+    inv = np.empty(num_prompts, dtype=np.float32)
+    for start in range(0, num_prompts, chunk):
+        block = np.asarray(_layer_chunk(trajectories, start, start + chunk, layer), dtype=np.float64)
+        inv[start:start + len(block)] = 1.0 / (np.linalg.norm(block, axis=1) + 1e-8)
+    return inv
+
+
+def _block_size_for_budget(budget_bytes: int, dim: int, k: int) -> int:
+    """
+    Largest tile side b whose working set fits the budget.
+
+    Per tile: b^2 float32 similarities plus b * (k + b) float32 / int64
+    top-k candidates and their argpartition result, and two (b, dim) float32 blocks.
+    """
+    quadratic = 4 + 12 + 8  # sims, candidate scores + indices, partition indices
+    linear = 2 * 4 * dim + 12 * k
+    b = (-linear + math.sqrt(linear * linear + 4 * quadratic * budget_bytes)) / (2 * quadratic)
+    return max(1, int(b))
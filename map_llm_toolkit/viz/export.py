@@ -0,0 +1,235 @@
+"""
+Parallel, headless figure export.
+
+export_figures renders a list of FigureSpec (plotting function + data +
+output path) in a pool of worker processes on the Agg backend and writes
+the PNG / SVG files in parallel. Large arrays are not pickled: they are
+written once to memory-mapped `.npy` files (or, if they already are
+file-backed memmaps, referenced in place) and each worker maps them
+read-only.
+"""
+
+import inspect
+import mmap
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+
+@dataclass
+class FigureSpec:
+    """
+    One figure to export.
+
+    Attributes
+    ----------
+    func :
+        Plotting function, either a picklable module-level callable or the
+        name of a map_llm_toolkit plotting function (e.g.
+        "plot_safety_trajectories"). It must return a matplotlib Figure (or
+        Axes); anything else raises TypeError. Functions with a `save_path`
+        parameter are called with save_path=None unless `kwargs` sets it,
+        so they return their figure instead of saving it themselves.
+    path :
+        Output file; the extension (.png, .svg, .pdf, ...) selects the format.
+    args, kwargs :
+        Data and options for `func`. Arrays may be nested in lists, tuples
+        and dicts.
+    dpi :
+        Save resolution; None uses the figure's own dpi.
+    """
+
+    func: Union[str, Callable[..., Any]]
+    path: str
+    args: Tuple[Any, ...] = ()
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    dpi: Optional[float] = None
+
+
+@dataclass
+class _SharedArray:
+    """Picklable reference to a read-only memory-mapped array."""
+
+    filename: str
+    dtype: str
+    shape: Tuple[int, ...]
+    offset: int
+    order: str
+
+    def open(self) -> np.memmap:
+        return np.memmap(
+            self.filename, dtype=np.dtype(self.dtype), mode="r",
+            offset=self.offset, shape=self.shape, order=self.order,
+        )
+
+
+def export_figures(
+    specs: Sequence[FigureSpec],
+    num_workers: Optional[int] = None,
+    share_threshold_bytes: int = 1 << 20,
+    tmp_dir: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Render and save figures in parallel worker processes.
+
+    Parameters
+    ----------
+    specs : sequence of FigureSpec
+    num_workers : int, optional
+        Worker processes. Defaults to min(len(specs), cpu count).
+    share_threshold_bytes : int
+        Arrays at least this large are passed as memory maps instead of
+        being pickled to every worker.
+    tmp_dir : str, optional
+        Where in-memory arrays are spilled for sharing; a temporary
+        directory that is removed afterwards by default.
+
+    Returns
+    -------
+    timings : list of dicts, in spec order, with keys
+        "path", "render_seconds", "save_seconds", "seconds"
+    """
+    if len(specs) == 0:
+        return []
+    num_workers = num_workers or min(len(specs), os.cpu_count() or 1)
+
+    start_time = time.perf_counter()
+    spill_dir = tempfile.mkdtemp(prefix="map_export_", dir=tmp_dir)
+    try:
+        shared: Dict[int, _SharedArray] = {}
+        tasks = [
+            (
+                spec.func,
+                spec.path,
+                _share(spec.args, spill_dir, share_threshold_bytes, shared),
+                _share(spec.kwargs, spill_dir, share_threshold_bytes, shared),
+                spec.dpi,
+            )
+            for spec in specs
+        ]
+        # spawn: a fresh interpreter picks the Agg backend before pyplot is imported
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(num_workers, initializer=_init_worker) as pool:
+            timings = pool.starmap(_render_one, tasks, chunksize=1)
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    print(
+        f"[MAP] Exported {len(specs)} figures with {num_workers} workers in "
+        f"{time.perf_counter() - start_time:.2f}s"
+    )
+    return timings
+
+
+def _init_worker() -> None:
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def _render_one(
+    func: Union[str, Callable[..., Any]],
+    path: str,
+    args: Tuple[Any, ...],
+    kwargs: Dict[str, Any],
+    dpi: Optional[float],
+) -> Dict[str, Any]:
+    import matplotlib.pyplot as plt
+    from matplotlib.figure import Figure
+
+    if isinstance(func, str):
+        import map_llm_toolkit
+
+        func = getattr(map_llm_toolkit, func)
+    kwargs = _unshare(kwargs)
+    if "save_path" not in kwargs and _accepts_save_path(func):
+        kwargs["save_path"] = None
+
+    start = time.perf_counter()
+    fig = func(*_unshare(args), **kwargs)
+    rendered = time.perf_counter()
+    fig = getattr(fig, "figure", fig)  # Axes -> Figure
+    if not isinstance(fig, Figure):
+        raise TypeError(
+            f"FigureSpec for {path!r}: {getattr(func, '__name__', func)!r} returned "
+            f"{type(fig).__name__}, expected a matplotlib Figure"
+        )
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    fig.savefig(path, dpi=dpi if dpi is not None else "figure")
+    plt.close(fig)
+    done = time.perf_counter()
+    return {
+        "path": path,
+        "render_seconds": rendered - start,
+        "save_seconds": done - rendered,
+        "seconds": done - start,
+    }
+
+
+def _accepts_save_path(func: Callable[..., Any]) -> bool:
+    try:
+        return "save_path" in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def _share(value: Any, spill_dir: str, threshold: int, shared: Dict[int, _SharedArray]) -> Any:
+    """
+    Replace large arrays in a nested structure with _SharedArray references.
+    """
+    if isinstance(value, np.ndarray):
+        if value.nbytes < threshold or value.dtype.hasobject:
+            return value
+        if id(value) not in shared:
+            shared[id(value)] = _file_backed(value) or _spill(value, spill_dir, len(shared))
+        return shared[id(value)]
+    if isinstance(value, dict):
+        return {k: _share(v, spill_dir, threshold, shared) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_share(v, spill_dir, threshold, shared) for v in value]
+    if type(value) is tuple:
+        return tuple(_share(v, spill_dir, threshold, shared) for v in value)
+    return value
+
+
+def _unshare(value: Any) -> Any:
+    if isinstance(value, _SharedArray):
+        return value.open()
+    if isinstance(value, dict):
+        return {k: _unshare(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_unshare(v) for v in value]
+    if type(value) is tuple:
+        return tuple(_unshare(v) for v in value)
+    return value
+
+
+def _file_backed(array: np.ndarray) -> Optional[_SharedArray]:
+    """
+    Reference to an existing memmap's file, if it maps that file directly (not a view of it).
+    """
+    if not isinstance(array, np.memmap) or not isinstance(array.base, mmap.mmap):
+        return None
+    if array.filename is None or not (array.flags.c_contiguous or array.flags.f_contiguous):
+        return None
+    order = "C" if array.flags.c_contiguous else "F"
+    return _SharedArray(array.filename, array.dtype.str, array.shape, array.offset, order)
+
+
+def _spill(array: np.ndarray, spill_dir: str, index: int) -> _SharedArray:
+    """
+    Write an in-memory array to a `.npy` file and reference it as a memmap.
+    """
+    path = os.path.join(spill_dir, f"array_{index:05d}.npy")
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=array.dtype, shape=array.shape)
+    out[...] = array
+    out.flush()
+    shared = _SharedArray(path, out.dtype.str, out.shape, out.offset, "C")
+    del out
+    return shared
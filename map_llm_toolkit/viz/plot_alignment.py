@@ -2,7 +2,7 @@
 Visualization helpers for alignment profiles A(ℓ) and ΔA(ℓ).
 """
 
-from typing import List, Dict, Any, Sequence, Tuple
+from typing import List, Dict, Any, Optional, Sequence, Tuple
 import numpy as np
 import matplotlib.pyplot as plt
 
@@ -13,8 +13,8 @@ def plot_alignment_profiles(
         "Layer-wise Alignment A for Tight vs Sparse Semantics\n"
         "(and ΔA = A_tight - A_sparse)"
     ),
-    save_path: str = "alignment_delta_profile.png",
-) -> None:
+    save_path: Optional[str] = "alignment_delta_profile.png",
+) -> Optional[plt.Figure]:
     """
     Plot layer-wise alignment profiles for one or more models.
 
@@ -25,9 +25,16 @@ def plot_alignment_profiles(
         - "A_sparse": np.ndarray of shape (num_layers,)
         - "DeltaA": np.ndarray of shape (num_layers,)
 
+    Optional keys "A_tight_ci", "A_sparse_ci" and "DeltaA_ci", each a
+    (2, num_layers) array of lower / upper bounds as returned by
+    `alignment_delta_significance`, are drawn as shaded bands.
+
     This function will create N subplots (N = len(results)),
     sharing y-axis, with A_tight / A_sparse in solid / dashed lines
     and ΔA as a thin gray dash-dot line.
+
+    The figure is saved to `save_path` and closed. With save_path=None it
+    is returned instead, e.g. for export_figures or further styling.
     """
     if len(results) == 0:
         raise ValueError("plot_alignment_profiles: `results` is empty.")
@@ -48,7 +55,7 @@ def plot_alignment_profiles(
 
         name = str(res.get("name", "Model"))
 
-        ax.plot(
+        (tight_line,) = ax.plot(
             L,
             A_tight,
             marker="o",
@@ -56,7 +63,7 @@ def plot_alignment_profiles(
             linewidth=1.5,
             label="Tight semantics A",
         )
-        ax.plot(
+        (sparse_line,) = ax.plot(
             L,
             A_sparse,
             marker="s",
@@ -64,7 +71,7 @@ def plot_alignment_profiles(
             linewidth=1.5,
             label="Sparse semantics A",
         )
-        ax.plot(
+        (delta_line,) = ax.plot(
             L,
             DeltaA,
             linestyle=":",
@@ -73,6 +80,16 @@ def plot_alignment_profiles(
             label="ΔA = A_tight - A_sparse",
         )
 
+        # Confidence bands, when provided
+        for key, line in (
+            ("A_tight_ci", tight_line),
+            ("A_sparse_ci", sparse_line),
+            ("DeltaA_ci", delta_line),
+        ):
+            if key in res:
+                lower, upper = np.asarray(res[key])
+                ax.fill_between(L, lower, upper, color=line.get_color(), alpha=0.2, linewidth=0)
+
         ax.set_title(name)
         ax.set_xlabel("Layer Index")
         ax.grid(True, alpha=0.3)
@@ -82,6 +99,8 @@ def plot_alignment_profiles(
     fig.suptitle(title, fontsize=12)
     plt.tight_layout(rect=[0, 0.03, 1, 0.95])
 
+    if save_path is None:
+        return fig
     fig.savefig(save_path, dpi=150)
     print(f"[MAP] Alignment profile figure saved to: {save_path}")
     plt.close(fig)
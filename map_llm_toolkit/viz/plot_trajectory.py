@@ -2,12 +2,15 @@ from typing import List, Sequence, Tuple, Optional
 
 import matplotlib.pyplot as plt
 import numpy as np
+from matplotlib.collections import LineCollection
 
 
 def plot_convergence_trajectories(
     trajectories_per_model: Sequence[Tuple[str, List[np.ndarray]]],
     figsize: Tuple[int, int] = (16, 7),
     dpi: int = 300,
+    bulk_threshold: int = 200,
+    density_threshold: Optional[int] = 5000,
 ):
     """
     Parameters
@@ -15,6 +18,14 @@ def plot_convergence_trajectories(
     trajectories_per_model :
         List of (model_name, list_of_2D_trajectories).
         每个 2D 轨迹是 (T, 2) 的 numpy 数组。
+    bulk_threshold :
+        Above this many trajectories per model, all paths are drawn as one
+        LineCollection and all start / end markers as one scatter each,
+        instead of one artist per trajectory. The figure looks the same.
+    density_threshold :
+        Above this many trajectories per model, the individual paths are
+        replaced by a rasterized log-density (hexbin) layer of all points.
+        None keeps drawing paths.
     """
     num_models = len(trajectories_per_model)
     fig, axes = plt.subplots(1, num_models, figsize=figsize, dpi=dpi)
@@ -25,10 +36,15 @@ def plot_convergence_trajectories(
     for ax, (model_name, traj_list) in zip(axes, trajectories_per_model):
         colors = plt.cm.Blues(np.linspace(0.4, 1.0, len(traj_list)))
 
-        for i, path in enumerate(traj_list):
-            ax.plot(path[:, 0], path[:, 1], marker=".", linewidth=1, color=colors[i], alpha=0.7)
-            ax.scatter(path[0, 0], path[0, 1], marker="x", s=40, color=colors[i], label="Input" if i == 0 else "")
-            ax.scatter(path[-1, 0], path[-1, 1], marker="o", s=30, color="black", label="Attractor" if i == 0 else "")
+        if density_threshold is not None and len(traj_list) > density_threshold:
+            _draw_density(ax, traj_list, colors)
+        elif len(traj_list) > bulk_threshold:
+            _draw_bulk(ax, traj_list, colors)
+        else:
+            for i, path in enumerate(traj_list):
+                ax.plot(path[:, 0], path[:, 1], marker=".", linewidth=1, color=colors[i], alpha=0.7)
+                ax.scatter(path[0, 0], path[0, 1], marker="x", s=40, color=colors[i], label="Input" if i == 0 else "")
+                ax.scatter(path[-1, 0], path[-1, 1], marker="o", s=30, color="black", label="Attractor" if i == 0 else "")
 
         ax.set_title(f"Model: {model_name}")
         ax.set_xlabel("PC 1")
@@ -40,6 +56,54 @@ def plot_convergence_trajectories(
     fig.tight_layout()
     return fig
 
+
+def _draw_endpoints(
+    ax, traj_list: List[np.ndarray], colors: np.ndarray, scale: float = 1.0, alpha=None, rasterized: bool = False
+) -> None:
+    starts = np.array([path[0] for path in traj_list])
+    ends = np.array([path[-1] for path in traj_list])
+    ax.scatter(
+        starts[:, 0], starts[:, 1], marker="x", s=40 * scale, color=colors, alpha=alpha,
+        label="Input", rasterized=rasterized,
+    )
+    ax.scatter(
+        ends[:, 0], ends[:, 1], marker="o", s=30 * scale, color="black", alpha=alpha,
+        label="Attractor", rasterized=rasterized,
+    )
+
+
+def _draw_bulk(ax, traj_list: List[np.ndarray], colors: np.ndarray) -> None:
+    """
+    Same picture as the per-trajectory loop, with three artists in total.
+    """
+    lines = LineCollection(
+        [np.asarray(path)[:, :2] for path in traj_list], colors=colors, linewidths=1, alpha=0.7
+    )
+    ax.add_collection(lines)
+    # Point markers of each path (the loop's marker="."), colored like their path
+    points = np.concatenate([np.asarray(path)[:, :2] for path in traj_list], axis=0)
+    point_colors = np.repeat(colors, [len(path) for path in traj_list], axis=0)
+    ax.scatter(
+        points[:, 0], points[:, 1], marker=".", s=plt.rcParams["lines.markersize"] ** 2,
+        color=point_colors, alpha=0.7, linewidths=plt.rcParams["lines.markeredgewidth"],
+    )
+    _draw_endpoints(ax, traj_list, colors)
+    ax.autoscale_view()
+
+
+def _draw_density(ax, traj_list: List[np.ndarray], colors: np.ndarray) -> None:
+    """
+    Log-density of all trajectory points plus endpoint markers, all rasterized.
+    """
+    points = np.concatenate([np.asarray(path)[:, :2] for path in traj_list], axis=0)
+    ax.hexbin(
+        points[:, 0], points[:, 1], gridsize=150, bins="log", cmap="Blues", mincnt=1,
+        rasterized=True,
+    )
+    # Small, translucent endpoints so the density stays visible underneath
+    _draw_endpoints(ax, traj_list, colors, scale=0.25, alpha=0.3, rasterized=True)
+
+
 def plot_safety_trajectories(
     traj_rigid_2d: np.ndarray,
     traj_adaptive_2d: np.ndarray,